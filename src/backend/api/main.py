@@ -4,8 +4,9 @@ Interact via SwaggerUi: http://localhost:8000/chat/docs
 
 import logging
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 from src.backend.utils.logging import setup_logging
 from src.backend.api.deps import get_config
@@ -83,8 +84,25 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint for the FastAPI server."""
-    return {"status": "healthy"}
+    """Health check endpoint for the FastAPI server.
+
+    Answers 200 "healthy" once every lazily loaded component is ready, and
+    503 "starting" while they load or "degraded" if one failed to load.
+    `components` reports the state of each.
+    """
+    if not getattr(app.state, "startup_complete", False):
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "starting", "ready": False, "components": {}}
+        )
+    readiness = app.state.service_container.readiness()
+    if readiness['ready']:
+        return {"status": "healthy", **readiness}
+    failed = 'failed' in readiness['components'].values()
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "degraded" if failed else "starting", **readiness}
+    )
 
 
 def main() -> None:
@@ -7,6 +7,7 @@ from src.backend.chat.service_container import ServiceContainer
 from src.backend.models.human_agent import ToggleReason, AgentType
 from src.backend.api.serialization import serialize_mongodb_doc
 from src.backend.api.deps import get_service_container
+from src.backend.utils.llm import LLM
 
 
 logger = logging.getLogger(__name__)
@@ -87,4 +88,38 @@ async def get_chat_history(
         
     except Exception as e:
         logger.error(f"Error getting chat history for staff: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/cache/stats")
+async def get_cache_stats(
+    services: ServiceContainer = Depends(get_service_container)
+):
+    """Hit/miss counters of the retrieval and response caches, and how
+    many calls joined an identical in-flight call"""
+    retriever = services.hybrid_retriever
+    embedding_cache = retriever.embedding_cache if retriever else None
+    coalesced = {'llm_generate': LLM.inflight.stats()}
+    if retriever:
+        coalesced['query_embedding'] = retriever.embed_flight.stats()
+        coalesced['search'] = retriever.search_flight.stats()
+    return {
+        "query_embedding": (
+            embedding_cache.stats() if embedding_cache else None
+        ),
+        "response": (
+            services.response_cache.stats()
+            if services.response_cache else None
+        ),
+        "coalesced": coalesced
+    }
+
+
+@router.get("/human_detection/stats")
+async def get_human_detection_stats(
+    services: ServiceContainer = Depends(get_service_container)
+):
+    """How human-request decisions were made: by pattern or by the LLM"""
+    if not services.human_handler:
+        return None
+    return services.human_handler.detector.stats()
@@ -2,6 +2,7 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
 from datetime import datetime
 import json
+import uuid
 from starlette.websockets import WebSocketState
 from src.backend.api.deps import get_websocket_service_container
 from src.backend.chat.service_container import ServiceContainer
@@ -27,12 +28,13 @@ async def handle_customer_message(
 ) -> None:
     """Process a message from a customer, broadcast responses to all clients.
     
-    1. Processes the customer's message using the QueryHandler
-    2. Retrieves or creates the appropriate session
-    3. Determines the response role based on current agent type
-    4. Broadcasts the original customer message to all clients in the session
-    5. Broadcasts the response (from bot or human agent) to all clients in
-        the session
+    1. Broadcasts the original customer message to all clients in the session
+    2. Processes the customer's message using the QueryHandler, streaming
+        the bot response to all clients as `bot_delta` frames
+    3. Retrieves or creates the appropriate session
+    4. Determines the response role based on current agent type
+    5. Broadcasts the complete response (from bot or human agent) to all
+        clients in the session, with the message_id of the deltas
     
     Args:
         services: Container with service dependencies for processing messages.
@@ -49,17 +51,6 @@ async def handle_customer_message(
     if message_time is None:
         message_time = datetime.now()
 
-    response = await services.query_handler.handle_query(
-        content,
-        session_id,
-        customer_id
-    )
-    session = await services.get_or_create_session(session_id, customer_id)
-    response_role = (
-        MessageRole.HUMAN_AGENT 
-        if session.current_agent == AgentType.HUMAN 
-        else MessageRole.BOT
-    )
     # Broadcast the customer's message to all connections
     await manager.broadcast_to_session(
         session_id,
@@ -74,11 +65,41 @@ async def handle_customer_message(
             }
         }
     )
+    # Deltas and the final message share an id, so clients can replace
+    # the streamed text with the complete message
+    message_id = str(uuid.uuid4())
+
+    async def send_delta(delta: str) -> None:
+        await manager.broadcast_to_session(
+            session_id,
+            {
+                "type": "bot_delta",
+                "message_id": message_id,
+                "delta": delta,
+                "timestamp": message_time.isoformat(),
+                "session_id": session_id,
+                "customer_id": customer_id
+            }
+        )
+
+    response = await services.query_handler.handle_query(
+        content,
+        session_id,
+        customer_id,
+        on_delta=send_delta
+    )
+    session = await services.get_or_create_session(session_id, customer_id)
+    response_role = (
+        MessageRole.HUMAN_AGENT 
+        if session.current_agent == AgentType.HUMAN 
+        else MessageRole.BOT
+    )
     # Broadcast the response, from bot or human agent, to all connections
     await manager.broadcast_to_session(
         session_id,
         {
             "type": "new_message",
+            "message_id": message_id,
             "message": {
                 "role": response_role,
                 "content": response,
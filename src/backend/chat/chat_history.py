@@ -1,8 +1,12 @@
+import asyncio
 import logging
+from collections import deque
 from datetime import datetime
 from typing import List, Dict, Optional
 from pymongo import DESCENDING
 from src.backend.models.human_agent import ChatTurn, MessageRole
+from src.backend.chat.history_formatter import HistoryFormatter
+from src.backend.utils.llm import LLM
 
 
 logger = logging.getLogger(__name__)
@@ -15,24 +19,103 @@ class ChatHistory:
         session_id: str,
         customer_id: str,
         collection=None,
-        max_turns_for_prompt: int = 30
+        max_turns_for_prompt: int = 30,
+        writer=None,
+        ring_buffer_size: int = 50
     ):
         self.cfg = cfg
         self.collection = collection
+        # Optional ChatHistoryWriter, writes turns behind the broadcast
+        self.writer = writer
         self.session_id = session_id
         self.customer_id = customer_id
-        self.conversation_turns = []
         self.max_turns_for_prompt = max_turns_for_prompt
+        # Turns added through this instance, bounded like the recent turns
+        # so long-lived sessions do not grow without limit
+        self.conversation_turns = deque(
+            maxlen=max(ring_buffer_size, max_turns_for_prompt)
+        )
         self._last_processed_timestamp = None  # Track last processed message
+        # Recent turns of this session, loaded from MongoDB once and then
+        # kept up to date by add_turn, so reads need no round-trip
+        self._recent_turns = deque(
+            maxlen=max(ring_buffer_size, max_turns_for_prompt)
+        )
+        self._message_count = 0
+        self._hydrated = False
+        self._hydrate_lock = asyncio.Lock()
+        # Formatted history per agent, reused until the next add_turn
+        self._formatted_history: Dict[Optional[str], str] = {}
+        history_cfg = cfg.get('chat_history', {}) if cfg else {}
+        self.formatter = HistoryFormatter(
+            history_cfg.get('tokenizer_model', 'gpt-4o-mini')
+        )
+        self.default_token_budget = history_cfg.get('prompt_token_budget', 1500)
+        self.token_budgets = dict(
+            history_cfg.get('prompt_token_budgets', {}) or {}
+        )
+        # Rolling summaries of turns trimmed from the prompts, updated in the
+        # background and covering the turns before _summary_upto (an index
+        # into all turns of the session)
+        self.summary_prompts = cfg.get('chat_history_prompts') if cfg else None
+        self.summarize = bool(
+            history_cfg.get('summarize_trimmed_turns', False)
+            and self.summary_prompts
+        )
+        self.summary_model = history_cfg.get('summary_model', 'gpt-4o-mini')
+        self.summary_max_tokens = history_cfg.get('summary_max_tokens', 200)
+        self.summarizer = LLM() if self.summarize else None
+        # Kept per token budget, each covers the turns its budget trims
+        self._summaries: Dict[int, str] = {}
+        self._summary_upto: Dict[int, int] = {}
+        self._summary_tasks: Dict[int, asyncio.Task] = {}
+
+    async def _hydrate(self) -> None:
+        """Load recent turns and the message count of the session once"""
+        if self._hydrated:
+            return
+        async with self._hydrate_lock:
+            if self._hydrated:
+                return
+            await self._flush_writes()
+            query = {
+                'customer_id': self.customer_id,
+                'session_id': self.session_id
+            }
+            cursor = self.collection.find(query).sort(
+                'timestamp', DESCENDING
+            ).limit(self._recent_turns.maxlen)
+            turns = await cursor.to_list(length=self._recent_turns.maxlen)
+            # Replaces turns appended while MongoDB was unreachable, they
+            # were flushed above and are part of the result
+            self._recent_turns.clear()
+            self._recent_turns.extend(reversed(turns))
+            self._message_count = await self.collection.count_documents(
+                {'session_id': self.session_id}
+            )
+            self._formatted_history.clear()
+            self._hydrated = True
+            logger.info(f"Loaded {len(turns)} recent turns of "
+                        f"{self._message_count} for session {self.session_id}")
 
     async def add_turn(
         self,
         role: str,
         content: str,
-        metadata: Optional[Dict] = None
+        metadata: Optional[Dict] = None,
+        timestamp: Optional[datetime] = None
     ) -> None:
-        """Add a turn to conversation history with full metadata for MongoDB"""
-        timestamp = datetime.now()
+        """Add a turn to conversation history with full metadata for MongoDB
+
+        With a writer, the turn is queued for a batched insert and the
+        broadcast does not wait for MongoDB.
+        """
+        if timestamp is None:
+            timestamp = datetime.now()
+        try:
+            await self._hydrate()
+        except Exception as e:
+            logger.error(f"Error loading recent turns: {str(e)}")
         try:
             role_str = (
                 role.value
@@ -53,8 +136,16 @@ class ChatHistory:
                 if hasattr(turn, 'dict')
                 else turn.model_dump()
             )
-            result = await self.collection.insert_one(turn_dict)
-            logger.info(f"Added message with ID: {result.inserted_id}")
+            self._recent_turns.append(turn_dict)
+            self._message_count += 1
+            self._formatted_history.clear()
+            if self.writer is not None:
+                self.writer.add(turn_dict)
+                logger.info(f"Queued {role_str} message for session "
+                            f"{self.session_id}")
+            else:
+                result = await self.collection.insert_one(turn_dict)
+                logger.info(f"Added message with ID: {result.inserted_id}")
             
             message_data = {
                 "type": "new_message",
@@ -71,44 +162,117 @@ class ChatHistory:
         except Exception as e:
             logger.error(f"Error adding turn to history: {str(e)}")
 
-    async def format_history_for_prompt(self) -> str:
-        """Format last N turns in simple format for prompt to save tokens"""
-        turns = []
+    async def _flush_writes(self, whole_customer: bool = False) -> None:
+        """Write queued turns before reading them back from MongoDB"""
+        if self.writer is None:
+            return
+        if whole_customer:
+            await self.writer.flush()
+        else:
+            await self.writer.flush_session(self.session_id)
+
+    @property
+    def cached_message_count(self) -> Optional[int]:
+        """Message count if already loaded, without a MongoDB read"""
+        return self._message_count if self._hydrated else None
+
+    async def count_turns(self) -> int:
+        """Number of turns in this session"""
+        await self._hydrate()
+        return self._message_count
+
+    async def get_session_turns(self, limit: int = 10) -> List[Dict]:
+        """Most recent turns of this session, newest first, from memory"""
+        await self._hydrate()
+        turns = list(self._recent_turns)[-limit:]
+        turns.reverse()
+        return turns
+
+    async def format_history_for_prompt(
+        self, agent: Optional[str] = None
+    ) -> str:
+        """Format the last turns in simple format for prompt to save tokens
+
+        Keeps the newest of the last N turns that fit the token budget of
+        the agent (chat_history.prompt_token_budgets), preceded by the
+        rolling summary of older turns if there is one. Built from the
+        in-memory recent turns and reused until the next add_turn.
+        """
         try:
-            cursor = self.collection.find({
-                'customer_id': self.customer_id,
-                'session_id': self.session_id
-            }).sort('timestamp', DESCENDING).limit(self.max_turns_for_prompt)
-            
-            turns = await cursor.to_list(length=self.max_turns_for_prompt)
-            
-            if not turns:
-                logger.info("No messages found with customer_id, session_id. "
-                            "Trying without filters...")
-                cursor = self.collection.find({}).sort(
-                    'timestamp', DESCENDING
-                ).limit(self.max_turns_for_prompt)
-                turns = await cursor.to_list(length=self.max_turns_for_prompt)
-            
-            # Reverse to get chronological order
-            turns.reverse()
-            
-            # Format the turns into a string
-            formatted_history = "\n".join(
-                f"{turn.get('role', 'UNKNOWN').capitalize()}: "
-                f"{turn.get('content', '')}"
-                for turn in turns
-            )
-            logger.info(f"Successfully retrieved {len(turns)} messages")
-            return formatted_history
+            await self._hydrate()
+            formatted = self._formatted_history.get(agent)
+            if formatted is None:
+                turns = list(self._recent_turns)[-self.max_turns_for_prompt:]
+                budget = self.token_budgets.get(
+                    agent, self.default_token_budget
+                )
+                formatted, dropped = self.formatter.format(
+                    turns, budget, summary=self._summaries.get(budget)
+                )
+                self._formatted_history[agent] = formatted
+                # Index of the oldest turn in the prompt among all turns
+                first_kept = self._message_count - len(turns) + dropped
+                if first_kept > self._summary_upto.get(budget, 0):
+                    self._schedule_summary(budget, first_kept)
+                logger.info(f"Formatted {len(turns) - dropped} messages for "
+                            f"{agent or 'prompt'}, {dropped} trimmed")
+            return formatted
         except Exception as e:
             error_msg = f"Error retrieving conversation history: {str(e)}"
             logger.error(error_msg)
             return error_msg
     
+    def _schedule_summary(self, budget: int, upto: int) -> None:
+        """Extend the rolling summary of a token budget up to a turn index
+        in the background"""
+        if not self.summarize:
+            return
+        task = self._summary_tasks.get(budget)
+        if task is not None and not task.done():
+            return
+        self._summary_tasks[budget] = asyncio.create_task(
+            self._update_summary(budget, upto)
+        )
+
+    async def _update_summary(self, budget: int, upto: int) -> None:
+        try:
+            summary_upto = self._summary_upto.get(budget, 0)
+            first_index = self._message_count - len(self._recent_turns)
+            turns = [
+                turn for index, turn in enumerate(
+                    self._recent_turns, first_index
+                )
+                if summary_upto <= index < upto
+            ]
+            if turns:
+                summary = await self.summarizer.generate(
+                    self.summary_prompts['sys_prompt'],
+                    self.summary_prompts['user_prompt'].format(
+                        summary=self._summaries.get(budget) or 'None',
+                        turns="\n".join(
+                            self.formatter.format_turn(turn) for turn in turns
+                        )
+                    ),
+                    model=self.summary_model
+                )
+                # At most half the budget, like HistoryFormatter.format
+                self._summaries[budget] = self.formatter.truncate(
+                    summary.strip(),
+                    min(self.summary_max_tokens, budget // 2)
+                )
+            # Turns no longer in memory are left out of the summary
+            self._summary_upto[budget] = upto
+            self._formatted_history.clear()
+            logger.info(f"Updated {budget}-token history summary of session "
+                        f"{self.session_id} up to turn {upto}")
+        except Exception as e:
+            logger.error(f"Error summarizing chat history: {str(e)}")
+
     async def get_recent_turns(self, limit: int = 10) -> List[ChatTurn]:
         """Get recent turns from MongoDB"""
         try:
+            # Reads across the customer's sessions
+            await self._flush_writes(whole_customer=True)
             # Try with customer_id and session_id first
             cursor = self.collection.find({
                 'customer_id': self.customer_id
@@ -128,8 +292,8 @@ class ChatHistory:
             return []
 
     def get_full_history(self) -> List[Dict]:
-        """Get full conversation history for MongoDB storage"""
-        return self.conversation_turns
+        """Get the turns added through this instance, up to the buffer size"""
+        return list(self.conversation_turns)
         
     async def get_transfer_context(self) -> Dict:
         """Get context information when transferring to human agent
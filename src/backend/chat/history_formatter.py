@@ -0,0 +1,80 @@
+"""Token-budgeted formatting of chat history for prompts.
+
+The newest turns are kept while they fit the token budget of the agent the
+prompt is for. Older turns are dropped, or represented by a rolling summary
+that the session's ChatHistory updates in the background.
+"""
+import logging
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PREFIX = "Summary of earlier conversation: "
+
+
+@lru_cache(maxsize=None)
+def _tokenizer(model: str) -> tiktoken.Encoding:
+    """Get or create a token encoder for the specified model."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+class HistoryFormatter:
+    def __init__(self, model: str = 'gpt-4o-mini'):
+        self.encoder = _tokenizer(model)
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoder.encode(text, disallowed_special=()))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut a text to at most max_tokens tokens"""
+        tokens = self.encoder.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return self.encoder.decode(tokens[:max_tokens])
+
+    @staticmethod
+    def format_turn(turn: Dict) -> str:
+        return (
+            f"{turn.get('role', 'UNKNOWN').capitalize()}: "
+            f"{turn.get('content', '')}"
+        )
+
+    def format(
+        self,
+        turns: List[Dict],
+        budget_tokens: int,
+        summary: Optional[str] = None
+    ) -> Tuple[str, int]:
+        """Format the newest turns that fit the budget, oldest first
+
+        A summary of earlier turns is put in front if given and counts
+        against the budget, up to half of it.
+
+        Returns:
+            The formatted history and the number of (oldest) turns left out
+        """
+        lines = []
+        if summary:
+            summary = self.truncate(summary, budget_tokens // 2)
+            lines.append(SUMMARY_PREFIX + summary)
+        # Joined with newlines, so every line costs about one extra token
+        used = sum(self.count_tokens(line) + 1 for line in lines)
+        kept: List[str] = []
+        for turn in reversed(turns):
+            line = self.format_turn(turn)
+            cost = self.count_tokens(line) + 1
+            if used + cost > budget_tokens:
+                break
+            kept.append(line)
+            used += cost
+        if not kept and turns:
+            # The latest turn alone is over budget, keep its beginning
+            line = self.format_turn(turns[-1])
+            kept.append(self.truncate(line, max(budget_tokens - used, 0)))
+        kept.reverse()
+        return "\n".join(lines + kept), len(turns) - len(kept)
@@ -0,0 +1,171 @@
+"""Write-behind buffer for chat turns.
+
+Turns are queued in memory and written to MongoDB with insert_many, either
+after a short flush interval or once enough turns are buffered. Flushes are
+serialized, so turns are stored in the order they were added, which keeps
+the order within every session.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional
+from pymongo.errors import BulkWriteError, ConnectionFailure
+
+logger = logging.getLogger(__name__)
+
+
+class ChatHistoryWriter:
+    def __init__(
+        self,
+        collection,
+        flush_interval_ms: float = 50,
+        max_batch_size: int = 100,
+        max_retries: int = 3,
+        max_retry_delay_ms: float = 5000
+    ):
+        self.collection = collection
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        self.max_retry_delay = max_retry_delay_ms / 1000
+        # Consecutive failed writes other than connection failures
+        self._failures = 0
+        self._buffer: List[Dict] = []
+        # Unwritten turns per session, so readers only wait when needed
+        self._pending: Dict[str, int] = defaultdict(int)
+        self._flush_lock = asyncio.Lock()
+        self._has_data = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.written = 0
+
+    def _ensure_task(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def add(self, turn: Dict) -> None:
+        """Queue a turn document for writing, returns immediately"""
+        self._ensure_task()
+        self._buffer.append(turn)
+        self._pending[turn.get('session_id')] += 1
+        self._has_data.set()
+        if len(self._buffer) >= self.max_batch_size:
+            self._full.set()
+
+    def has_pending(self, session_id: Optional[str] = None) -> bool:
+        if session_id is None:
+            return bool(self._buffer)
+        return self._pending.get(session_id, 0) > 0
+
+    async def _run(self) -> None:
+        failures = 0
+        delay = self.flush_interval
+        while True:
+            await self._has_data.wait()
+            if not self._full.is_set():
+                try:
+                    await asyncio.wait_for(
+                        self._full.wait(), self.flush_interval
+                    )
+                except asyncio.TimeoutError:
+                    pass
+            try:
+                await self.flush()
+            except Exception as e:
+                failures += 1
+                # Back off, doubling up to max_retry_delay, so an outage is
+                # neither retried nor logged every flush interval
+                delay = min(delay * 2, self.max_retry_delay)
+                if failures == 1:
+                    logger.error(f"Error flushing chat history: {e}")
+                else:
+                    logger.debug(f"Chat history flush failed {failures} "
+                                 f"times, retrying in {delay:.2f}s: {e}")
+                await asyncio.sleep(delay)
+                continue
+            if failures:
+                logger.info(f"Chat history flushed after {failures} "
+                            f"failed attempts")
+            failures = 0
+            delay = self.flush_interval
+
+    def _settle(self, batch: List[Dict]) -> None:
+        """Take turns out of the pending counts"""
+        for turn in batch:
+            session_id = turn.get('session_id')
+            self._pending[session_id] -= 1
+            if self._pending[session_id] <= 0:
+                del self._pending[session_id]
+
+    def _requeue(self, batch: List[Dict]) -> None:
+        self._buffer[:0] = batch
+        for turn in batch:
+            self._pending[turn.get('session_id')] += 1
+        if self._buffer:
+            self._has_data.set()
+
+    async def flush(self) -> None:
+        """Write all buffered turns
+
+        Turns that fail on a lost connection are retried without limit,
+        on other errors up to max_retries times, then dropped. The
+        background flusher backs off between failed attempts.
+        """
+        async with self._flush_lock:
+            batch, self._buffer = self._buffer, []
+            self._has_data.clear()
+            self._full.clear()
+            if not batch:
+                return
+            retry: List[Dict] = []
+            try:
+                await self.collection.insert_many(batch, ordered=True)
+                self._failures = 0
+                self.written += len(batch)
+                self.flushes += 1
+                logger.debug(f"Flushed {len(batch)} chat turns")
+            except BulkWriteError as e:
+                # Ordered inserts stop at the first failing document
+                inserted = e.details.get('nInserted', 0)
+                logger.error(f"Dropping chat turn that failed to insert: "
+                             f"{e.details.get('writeErrors')}")
+                self.written += inserted
+                retry = batch[inserted + 1:]
+            except ConnectionFailure:
+                # Includes server selection and network timeouts
+                retry = batch
+                raise
+            except Exception as e:
+                self._failures += 1
+                if self._failures > self.max_retries:
+                    logger.error(f"Dropping {len(batch)} chat turns after "
+                                 f"{self._failures} failed writes: {e}")
+                    self._failures = 0
+                    raise
+                retry = batch
+                raise
+            finally:
+                # Pending counts always drop, requeued turns count again
+                self._settle(batch)
+                self._requeue(retry)
+
+    async def flush_session(self, session_id: str) -> None:
+        """Make sure the session's queued turns are written before a read"""
+        if self.has_pending(session_id):
+            await self.flush()
+
+    async def close(self) -> None:
+        """Stop the background flusher and write what is left"""
+        # Holding the lock, the flusher is never cancelled mid-insert
+        async with self._flush_lock:
+            if self._task is not None:
+                self._task.cancel()
+                try:
+                    await self._task
+                except (asyncio.CancelledError, Exception):
+                    pass
+                self._task = None
+        await self.flush()
+        logger.info(f"Chat history writer closed, {self.written} turns in "
+                    f"{self.flushes} batches")
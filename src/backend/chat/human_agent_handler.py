@@ -9,6 +9,7 @@ from src.backend.models.human_agent import (
     ToggleReason,
 )
 from src.backend.chat.chat_history import ChatHistory
+from src.backend.chat.human_request_detector import HumanRequestDetector
 from src.backend.utils.llm import LLM
 
 logger = logging.getLogger(__name__)
@@ -20,10 +21,26 @@ class HumanAgentHandler:
         self.cfg = services.cfg
         self.llm = LLM()
         self.prompts = self.cfg.human_agent_prompts
+        self.detector = HumanRequestDetector(
+            self.cfg.human_agent.get('detection', {})
+        )
 
     async def _detect_human_request(
         self, query: str, recent_history: str
     ) -> bool:
+        """Detect if user is requesting human agent
+
+        Clear cases are decided by patterns, the LLM only decides
+        ambiguous messages (or all, in 'llm' detection mode).
+        """
+        decision, path = self.detector.classify(query)
+        if decision is None:
+            decision = await self._detect_with_llm(query, recent_history)
+        self.detector.record(path, decision)
+        logger.info(f"Human request: {decision} ({path})")
+        return decision
+
+    async def _detect_with_llm(self, query: str, recent_history: str) -> bool:
         """Use LLM to detect if user is requesting human agent"""
         user_prompt = self.prompts.user_prompt.format(
             formatted_history=recent_history,
@@ -0,0 +1,85 @@
+"""Tiered detection of requests for a human agent.
+
+Clear cases are decided locally with regex patterns: explicit requests for
+a person transfer right away, and messages without any handoff signal
+continue with the bot. Only messages matching an ambiguous pattern (e.g.
+frustration or escalation words) are left to the LLM.
+"""
+import logging
+import re
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Decision paths, as counted in stats()
+PATTERN_TRANSFER = 'pattern_transfer'
+PATTERN_CONTINUE = 'pattern_continue'
+AMBIGUOUS = 'ambiguous'
+LLM = 'llm'
+
+MODES = ('tiered', 'heuristic', 'llm')
+
+
+class HumanRequestDetector:
+    def __init__(self, cfg: Dict):
+        """
+        Args:
+            cfg: human_agent.detection config with 'mode' (tiered,
+                heuristic or llm), 'transfer_patterns' and
+                'ambiguous_patterns' (name -> regex)
+        """
+        self.mode = cfg.get('mode', 'tiered')
+        if self.mode not in MODES:
+            raise ValueError(f"Unsupported detection mode: {self.mode}")
+        self.transfer_patterns = {
+            name: re.compile(pattern)
+            for name, pattern in (cfg.get('transfer_patterns') or {}).items()
+        }
+        self.ambiguous_patterns = {
+            name: re.compile(pattern)
+            for name, pattern in (cfg.get('ambiguous_patterns') or {}).items()
+        }
+        self.decisions = Counter()
+        self.transfers = Counter()
+
+    def classify(self, message: str) -> Tuple[Optional[bool], str]:
+        """Local decision for a message
+
+        Returns:
+            Whether to transfer, or None if the LLM has to decide, and the
+            decision path
+        """
+        if self.mode == 'llm':
+            return None, LLM
+        message_lower = message.lower()
+        for name, pattern in self.transfer_patterns.items():
+            if pattern.search(message_lower):
+                logger.info(f"Human request pattern matched: {name}")
+                return True, PATTERN_TRANSFER
+        for name, pattern in self.ambiguous_patterns.items():
+            if pattern.search(message_lower):
+                logger.info(f"Ambiguous handoff pattern matched: {name}")
+                if self.mode == 'heuristic':
+                    # Sentiment-based transfers still cover these
+                    return False, AMBIGUOUS
+                return None, AMBIGUOUS
+        return False, PATTERN_CONTINUE
+
+    def record(self, path: str, transfer: bool) -> None:
+        self.decisions[path] += 1
+        if transfer:
+            self.transfers[path] += 1
+
+    def stats(self) -> Dict:
+        total = sum(self.decisions.values())
+        llm_calls = self.decisions[LLM] + (
+            self.decisions[AMBIGUOUS] if self.mode == 'tiered' else 0
+        )
+        return {
+            'mode': self.mode,
+            'decisions': dict(self.decisions),
+            'transfers': dict(self.transfers),
+            'llm_calls': llm_calls,
+            'local_rate': (total - llm_calls) / total if total else 0.0,
+        }
@@ -1,14 +1,21 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
+import asyncio
+import hashlib
 import json
 import logging
+import time
 from pydantic import BaseModel
 import chromadb
 from chromadb.config import Settings
-import chromadb.utils.embedding_functions as embedding_functions
-from rank_bm25 import BM25Okapi
-from sentence_transformers import CrossEncoder
-import torch
 from utils.settings import SETTINGS
+from src.backend.chat.keyword_index import KeywordIndex
+from src.backend.chat.reranker import BatchingReranker, load_cross_encoder
+from src.backend.utils.embedding_cache import (
+    EmbeddingCache,
+    CachedEmbeddingFunction
+)
+from src.backend.utils.local_embedding import embedding_function_from_config
+from src.backend.utils.single_flight import SingleFlight, SyncSingleFlight
 
 
 logger = logging.getLogger(__name__)
@@ -33,18 +40,113 @@ class HybridRetriever:
             path=self.cfg.hybrid_retriever.persist_dir,
             settings=Settings(anonymized_telemetry=False)
         )
-        self.embedding_function = embedding_functions.OpenAIEmbeddingFunction(
-            api_key=SETTINGS.OPENAI_API_KEY,
-            model_name=self.cfg.llm.embedding_model
+        self.embedding_function = embedding_function_from_config(
+            self.cfg, api_key=SETTINGS.OPENAI_API_KEY
         )
         self.collection = self.client.get_collection(
             name=self.cfg.hybrid_retriever.collection,
             embedding_function=self.embedding_function
         )
+        cache_cfg = self.cfg.hybrid_retriever.get('embedding_cache')
+        if cache_cfg:
+            self.embedding_cache = EmbeddingCache(
+                max_size=cache_cfg.get('max_size', 10000),
+                ttl_seconds=cache_cfg.get('ttl_seconds'),
+                persist_path=cache_cfg.get('persist_path')
+            )
+            self.query_embedding_function = CachedEmbeddingFunction(
+                self.embedding_function,
+                self.cfg.llm.embedding_model,
+                self.embedding_cache
+            )
+        else:
+            self.embedding_cache = None
+            self.query_embedding_function = self.embedding_function
+        # Coalesce identical in-flight embedding requests and searches
+        self.embed_flight = SyncSingleFlight('query_embedding')
+        self.search_flight = SingleFlight('search')
         if cfg.hybrid_retriever.use_reranker:
-            self.reranker = CrossEncoder(cfg.hybrid_retriever.reranker_model)
+            self.reranker = BatchingReranker(
+                load_cross_encoder(
+                    cfg.hybrid_retriever.reranker_model,
+                    backend=cfg.hybrid_retriever.get(
+                        'reranker_backend', 'torch'
+                    ),
+                    onnx_dir=cfg.hybrid_retriever.get(
+                        'reranker_onnx_dir', './data/models/reranker_onnx'
+                    ),
+                    quantization_config=cfg.hybrid_retriever.get(
+                        'reranker_quantization', 'avx2'
+                    ),
+                    intra_op_threads=cfg.hybrid_retriever.get(
+                        'reranker_intra_op_threads'
+                    )
+                ),
+                batch_window_ms=cfg.hybrid_retriever.get(
+                    'reranker_batch_window_ms', 5
+                ),
+                max_batch_size=cfg.hybrid_retriever.get(
+                    'reranker_max_batch_size', 128
+                ),
+                max_workers=cfg.hybrid_retriever.get('reranker_workers', 1)
+            )
         else:
             self.reranker = None
+        self.keyword_index = KeywordIndex()
+        # Ingestion runs in another process, so the index is synced when
+        # the collection version changes, checked at most this often
+        self.keyword_check_seconds = cfg.hybrid_retriever.get(
+            'keyword_index_check_seconds', 60
+        )
+        self._keyword_version = None
+        self._keyword_checked = 0.0
+        self._keyword_lock = asyncio.Lock()
+
+    def build_keyword_index(self) -> None:
+        """Build the corpus-wide BM25 index from the whole collection"""
+        version = self.collection_version()
+        self.keyword_index.build(self.collection)
+        self._keyword_version = version
+        self._keyword_checked = time.monotonic()
+
+    def refresh_keyword_index(self) -> bool:
+        """Pick up chunks added to, deleted from or edited in the collection
+        since the index was built, without rebuilding it, if its version
+        changed.
+        """
+        self._keyword_checked = time.monotonic()
+        version = self.collection_version()
+        if version == self._keyword_version:
+            return False
+        changed = self.keyword_index.sync(self.collection)
+        self._keyword_version = version
+        return changed
+
+    async def ensure_keyword_index(self) -> None:
+        """Build the keyword index on first use and refresh it when due, in
+        a worker thread, once for concurrent callers"""
+        def due() -> bool:
+            return (
+                not self.keyword_index.built
+                or time.monotonic() - self._keyword_checked
+                >= self.keyword_check_seconds
+            )
+
+        if not due():
+            return
+        async with self._keyword_lock:
+            if not self.keyword_index.built:
+                await asyncio.to_thread(self.build_keyword_index)
+            elif due():
+                await asyncio.to_thread(self.refresh_keyword_index)
+
+    def close(self) -> None:
+        """Release resources held by the retriever"""
+        if self.reranker is not None:
+            self.reranker.close()
+        if self.embedding_cache is not None:
+            logger.info(f"Embedding cache stats: {self.embedding_cache.stats()}")
+            self.embedding_cache.close()
         
     def _normalize_scores(self, scores: List[float]) -> List[float]:
         """Min-max normalization of scores"""
@@ -59,7 +161,7 @@ class HybridRetriever:
     def _get_keyword_scores(
         self,
         query: str,
-        documents: List[str]
+        doc_ids: List[str]
     ) -> List[float]:
         """Get BM25 scores for keyword matching
         
@@ -67,69 +169,83 @@ class HybridRetriever:
         (how often words appear in the document), normalized longer documents,
         inverses document frequency (how common words are across documents). 
         Similar to TD-IDF + length normilization, etc. 
+        Term statistics come from the corpus-wide keyword index, so IDF
+        reflects the whole collection rather than just the candidates.
         """
-        # Tokenize documents
-        tokenized_docs = [doc.lower().split() for doc in documents]
-        # Create BM25 index from tokenized documents
-        bm25 = BM25Okapi(tokenized_docs)
-        
-        # Get keyword scores
-        tokenized_query = query.lower().split()
-        # Get BM25 scores for how well the query matches each document
-        keyword_scores = bm25.get_scores(tokenized_query)
+        keyword_scores = self.keyword_index.get_scores(query, doc_ids)
         # 0-1 normalize scores
-        return self._normalize_scores(keyword_scores.tolist())
+        return self._normalize_scores(keyword_scores)
 
-    async def _rerank_results(
-        self, query: str, search_results: List[SearchResult]
-    ) -> List[SearchResult]:
-        """Rerank search results using cross-encoder model"""
-        if not self.reranker or not search_results:
-            return search_results
-        # Prepare query-document pairs for reranking
-        query_doc_pairs = [(query, result.content) for result in search_results]
-        # Get scores from cross-encoder
-        with torch.no_grad():
-            scores = self.reranker.predict(query_doc_pairs)
-        # Update scores in search results
-        for i, score in enumerate(scores):
-            search_results[i].score = float(score)
-        # Return reranked results
-        return sorted(search_results, key=lambda x: x.score, reverse=True)
+    def _embed_queries(self, queries: List[str]) -> List[Any]:
+        """Embed all queries, cache misses in a single embedding request
 
-    async def search(
-        self,
-        query: str,
-        filter_conditions: Dict = None
-    ) -> List[SearchResult]:
+        Identical concurrent requests share one provider call.
         """
-        Perform hybrid search combining semantic and keyword matching
-        
-        Args:
-            query: Search query string
-            n_results: Number of results to return
-            filter_conditions: Optional filters for metadata fields
+        return self.embed_flight.do(
+            tuple(queries), lambda: self.query_embedding_function(queries)
+        )
+
+    def collection_version(self) -> str:
+        """Hash of the sorted chunk ids of the collection, for invalidation
+
+        Chunk ids are content hashes, so it changes when chunks are added,
+        deleted or edited, even if the count stays the same. Reads all ids,
+        call it from a worker thread.
         """
-        # Get semantic search results with scores
-        results = self.collection.query(
-            query_texts=[query],
+        ids = self.collection.get(include=[])['ids']
+        return hashlib.sha256('\n'.join(sorted(ids)).encode()).hexdigest()
+
+    def context_fingerprint(self, query: str) -> Tuple[Any, str]:
+        """Embedding of a query and a hash of the chunk ids a vector search
+        returns for it, without keyword scoring or reranking.
+
+        Chunk ids are content hashes, so the hash changes when the
+        retrieved context changes.
+        """
+        embedding = self._embed_queries([query])[0]
+        ids = self.collection.query(
+            query_embeddings=[embedding],
             n_results=self.cfg.hybrid_retriever.top_k,
-            where=filter_conditions,
-            include=['documents', 'metadatas', 'distances']
+            include=[]
+        )['ids'][0]
+        context_hash = hashlib.sha256(
+            '\x00'.join(sorted(ids)).encode('utf-8')
+        ).hexdigest()
+        return embedding, context_hash
+
+    def _hybrid_candidates(
+        self,
+        query: str,
+        doc_ids: List[str],
+        documents: List[str],
+        metadatas: List[Dict],
+        distances: List[float],
+        use_keyword_hits: bool
+    ) -> List[Tuple[str, SearchResult]]:
+        """Combine semantic and keyword scores for one query's candidates"""
+        doc_ids, documents, metadatas = (
+            list(doc_ids), list(documents), list(metadatas)
         )
-        logger.info(f"Initial Search Results: {results}")
-        
-        # Accessing the inner lists of results. Chromadb supports batch queries
-        documents = results['documents'][0]
-        metadatas = results['metadatas'][0]
         # Convert distances to similarity scores (1 - distance)
-        semantic_scores = self._normalize_scores(
-            [1 - d for d in results['distances'][0]]
-        )
+        semantic_scores = self._normalize_scores([1 - d for d in distances])
         logger.info(f"Semantic scores: {semantic_scores}")
+
+        # Keyword hits the vector search missed become candidates too.
+        if use_keyword_hits:
+            seen = set(doc_ids)
+            for doc_id, _ in self.keyword_index.top_k(
+                query, self.cfg.hybrid_retriever.top_k
+            ):
+                if doc_id in seen:
+                    continue
+                doc_ids.append(doc_id)
+                documents.append(self.keyword_index.documents[doc_id])
+                metadatas.append(self.keyword_index.metadatas[doc_id])
+                # Outside the vector top_k, so below every semantic hit
+                semantic_scores.append(0.0)
         
         # Get keyword search scores
-        keyword_scores = self._get_keyword_scores(query, documents)
+        keyword_scores = self._get_keyword_scores(query, doc_ids)
         
         # Combine scores
         combined_scores = [
@@ -137,9 +253,11 @@ class HybridRetriever:
             for ss, ks in zip(semantic_scores, keyword_scores)
         ]
         
-        # Sort results by combined score
-        search_results = []
-        for doc, meta, score in zip(documents, metadatas, combined_scores):
+        candidates = []
+        for doc_id, doc, meta, score in zip(
+            doc_ids, documents, metadatas, combined_scores
+        ):
+            meta = meta or {}
             keywords = json.loads(meta.get('keywords', '[]'))
             topics = json.loads(meta.get('related_topics', '[]'))
             metadata_object = SearchMetadata(
@@ -147,17 +265,143 @@ class HybridRetriever:
                 keywords=keywords,
                 related_topics=topics
             )
-
-            search_results.append(
+            candidates.append((
+                doc_id,
                 SearchResult(
                     content=doc,
                     score=score,
                     metadata=metadata_object
                 )
+            ))
+        return candidates
+
+    async def _rerank_results(
+        self,
+        queries: List[str],
+        candidates_per_query: List[List[Tuple[str, SearchResult]]]
+    ) -> None:
+        """Rerank candidates of all queries using cross-encoder model
+
+        All (query, document) pairs go through the model as one batch and
+        the scores are written back onto the search results.
+        """
+        if not self.reranker:
+            return
+        # Prepare query-document pairs for reranking
+        query_doc_pairs = [
+            (query, result.content)
+            for query, candidates in zip(queries, candidates_per_query)
+            for _, result in candidates
+        ]
+        if not query_doc_pairs:
+            return
+        # Get scores from cross-encoder, batched with concurrent requests
+        # and computed off the event loop
+        scores = await self.reranker.predict(query_doc_pairs)
+        # Update scores in search results
+        results = [
+            result
+            for candidates in candidates_per_query
+            for _, result in candidates
+        ]
+        for result, score in zip(results, scores):
+            result.score = float(score)
+
+    async def search_many(
+        self,
+        queries: List[str],
+        filter_conditions: Dict = None
+    ) -> List[List[SearchResult]]:
+        """
+        Perform hybrid search for several queries at once
+
+        Uses one embedding request, one Chroma query and one reranker batch
+        for all queries. A document retrieved by several queries is kept
+        only under the query it scores best for. Identical concurrent
+        searches share one run.
+
+        Args:
+            queries: Search query strings, e.g. the expanded queries
+            filter_conditions: Optional filters for metadata fields
+
+        Returns:
+            One list of search results per query, in the order of `queries`
+        """
+        if not queries:
+            return []
+        key = (
+            tuple(queries),
+            json.dumps(filter_conditions, sort_keys=True, default=str)
+        )
+        results_per_query = await self.search_flight.do(
+            key, lambda: self._search_many(queries, filter_conditions)
+        )
+        # Callers share the results, but not the lists
+        return [list(results) for results in results_per_query]
+
+    async def _search_many(
+        self,
+        queries: List[str],
+        filter_conditions: Dict = None
+    ) -> List[List[SearchResult]]:
+        await self.ensure_keyword_index()
+        # Embedding is a blocking provider call, kept off the event loop
+        query_embeddings = await asyncio.to_thread(
+            self._embed_queries, queries
+        )
+        # Get semantic search results with scores
+        results = await asyncio.to_thread(
+            self.collection.query,
+            query_embeddings=query_embeddings,
+            n_results=self.cfg.hybrid_retriever.top_k,
+            where=filter_conditions,
+            include=['documents', 'metadatas', 'distances']
+        )
+        logger.info(f"Initial Search Results: {results}")
+
+        # Metadata filters are only evaluated by Chroma, so keyword-only
+        # candidates are skipped when filters are given
+        candidates_per_query = [
+            self._hybrid_candidates(
+                query,
+                results['ids'][i],
+                results['documents'][i],
+                results['metadatas'][i],
+                results['distances'][i],
+                use_keyword_hits=not filter_conditions
             )
-        search_results = sorted(search_results, key=lambda x: x.score, reverse=True)
+            for i, query in enumerate(queries)
+        ]
         if self.cfg.hybrid_retriever.use_reranker:
-            search_results = await self._rerank_results(query, search_results)
-        search_results = search_results[:self.cfg.hybrid_retriever.reranker_top_k]
-        return search_results    
-        
\ No newline at end of file
+            await self._rerank_results(queries, candidates_per_query)
+
+        # Dedupe across queries, keeping each document's best-scoring query
+        best: Dict[str, Tuple[int, SearchResult]] = {}
+        for query_index, candidates in enumerate(candidates_per_query):
+            for doc_id, result in candidates:
+                if doc_id not in best or result.score > best[doc_id][1].score:
+                    best[doc_id] = (query_index, result)
+        results_per_query = [[] for _ in queries]
+        for query_index, result in best.values():
+            results_per_query[query_index].append(result)
+        return [
+            sorted(
+                search_results, key=lambda x: x.score, reverse=True
+            )[:self.cfg.hybrid_retriever.reranker_top_k]
+            for search_results in results_per_query
+        ]
+
+    async def search(
+        self,
+        query: str,
+        filter_conditions: Dict = None
+    ) -> List[SearchResult]:
+        """
+        Perform hybrid search combining semantic and keyword matching
+        
+        Args:
+            query: Search query string
+            filter_conditions: Optional filters for metadata fields
+        """
+        search_results = await self.search_many([query], filter_conditions)
+        return search_results[0]
@@ -0,0 +1,175 @@
+"""Corpus-wide BM25 keyword index kept in memory next to the Chroma collection.
+
+Term frequencies, document frequencies and document lengths are computed once
+when the index is built and updated incrementally as chunks are added or
+removed, so scoring a query only touches the postings of its own terms.
+"""
+import heapq
+import logging
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class KeywordIndex:
+    """Okapi BM25 over every document in a collection.
+
+    Uses the non-negative IDF variant log((N - df + 0.5) / (df + 0.5) + 1),
+    so very common terms score low instead of being clamped to an epsilon.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.documents: Dict[str, str] = {}
+        self.metadatas: Dict[str, Dict] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}  # term -> {id: tf}
+        self.total_length = 0
+        self.built = False
+        self._idf_cache: Dict[str, float] = {}
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        """Same whitespace tokenization the per-query BM25 used to apply"""
+        return text.lower().split()
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.documents
+
+    @property
+    def avg_doc_length(self) -> float:
+        if not self.documents:
+            return 0.0
+        return self.total_length / len(self.documents)
+
+    def add(
+        self,
+        ids: List[str],
+        documents: List[str],
+        metadatas: Optional[List[Dict]] = None
+    ) -> None:
+        """Add (or replace) documents and update term statistics."""
+        if metadatas is None:
+            metadatas = [{} for _ in ids]
+        for doc_id, doc, meta in zip(ids, documents, metadatas):
+            if doc_id in self.documents:
+                self._remove_one(doc_id)
+            doc = doc or ''
+            term_freqs = Counter(self.tokenize(doc))
+            for term, freq in term_freqs.items():
+                self.postings.setdefault(term, {})[doc_id] = freq
+            length = sum(term_freqs.values())
+            self.documents[doc_id] = doc
+            self.metadatas[doc_id] = meta or {}
+            self.doc_lengths[doc_id] = length
+            self.total_length += length
+        self._idf_cache.clear()
+
+    def remove(self, ids: Iterable[str]) -> None:
+        """Remove documents and update term statistics."""
+        for doc_id in ids:
+            if doc_id in self.documents:
+                self._remove_one(doc_id)
+        self._idf_cache.clear()
+
+    def _remove_one(self, doc_id: str) -> None:
+        for term in set(self.tokenize(self.documents[doc_id])):
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+        del self.documents[doc_id]
+        del self.metadatas[doc_id]
+
+    def build(self, collection, batch_size: int = 1000) -> None:
+        """Build the index from every document in a Chroma collection."""
+        self.documents.clear()
+        self.metadatas.clear()
+        self.doc_lengths.clear()
+        self.postings.clear()
+        self.total_length = 0
+        offset = 0
+        while True:
+            batch = collection.get(
+                include=['documents', 'metadatas'],
+                limit=batch_size,
+                offset=offset
+            )
+            if not batch['ids']:
+                break
+            self.add(batch['ids'], batch['documents'], batch['metadatas'])
+            offset += len(batch['ids'])
+        self.built = True
+        logger.info(f"Built keyword index over {len(self)} documents, "
+                    f"{len(self.postings)} terms")
+
+    def sync(self, collection) -> bool:
+        """Incrementally reconcile the index with the collection.
+
+        Returns True if any document was added or removed.
+        """
+        collection_ids = set(collection.get(include=[])['ids'])
+        indexed_ids = set(self.documents)
+        stale = indexed_ids - collection_ids
+        missing = list(collection_ids - indexed_ids)
+        if stale:
+            self.remove(stale)
+        if missing:
+            batch = collection.get(
+                ids=missing, include=['documents', 'metadatas']
+            )
+            self.add(batch['ids'], batch['documents'], batch['metadatas'])
+        self.built = True
+        if stale or missing:
+            logger.info(f"Keyword index synced: +{len(missing)} "
+                        f"-{len(stale)} documents")
+        return bool(stale or missing)
+
+    def _idf(self, term: str) -> float:
+        idf = self._idf_cache.get(term)
+        if idf is None:
+            num_docs = len(self.documents)
+            doc_freq = len(self.postings.get(term, ()))
+            idf = math.log(
+                (num_docs - doc_freq + 0.5) / (doc_freq + 0.5) + 1
+            )
+            self._idf_cache[term] = idf
+        return idf
+
+    def _term_score(self, term: str, doc_id: str, avg_len: float) -> float:
+        freq = self.postings.get(term, {}).get(doc_id)
+        if not freq:
+            return 0.0
+        norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / avg_len
+        return self._idf(term) * freq * (self.k1 + 1) / (freq + self.k1 * norm)
+
+    def get_scores(self, query: str, ids: List[str]) -> List[float]:
+        """BM25 score of the query against each of the given documents"""
+        terms = self.tokenize(query)
+        avg_len = self.avg_doc_length or 1.0
+        return [
+            sum(self._term_score(term, doc_id, avg_len) for term in terms)
+            if doc_id in self.documents else 0.0
+            for doc_id in ids
+        ]
+
+    def top_k(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """Best k (id, score) pairs over the whole corpus"""
+        avg_len = self.avg_doc_length or 1.0
+        scores: Dict[str, float] = {}
+        for term in self.tokenize(query):
+            for doc_id in self.postings.get(term, ()):
+                scores[doc_id] = (
+                    scores.get(doc_id, 0.0)
+                    + self._term_score(term, doc_id, avg_len)
+                )
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
@@ -88,7 +88,8 @@ class MessageAnalyzer:
             )
         
         # Perform full sentiment analysis
-        sentiment_result = await self.services.sentiment_analyzer.analyze_sentiment(message)
+        sentiment_analyzer = await self.services.get_sentiment_analyzer()
+        sentiment_result = await sentiment_analyzer.analyze_sentiment(message)
         
         return AnalysisResult(
             score=sentiment_result['score'],
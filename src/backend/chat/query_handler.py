@@ -1,7 +1,11 @@
+import asyncio
 import logging
-from typing import Tuple, Optional, List
+import time
+from typing import Awaitable, Callable, Tuple, Optional, List
 from pydantic import BaseModel
 from pydantic_ai import Agent
+from pydantic_ai.messages import ToolCallPart
+from pydantic_core import from_json
 from src.backend.models.human_agent import (
     AgentDecision,
     ToggleReason,
@@ -74,7 +78,7 @@ class QueryHandler:
                 response=None,  # Let human agent UI handle response
                 transfer_reason=None
             )
-        recent_turns = await chat_history.get_recent_turns()
+        recent_turns = await chat_history.get_session_turns()
         last_analyzed = sum(1 for turn in recent_turns if turn.get(
             'full_analysis', False)
         )
@@ -101,7 +105,9 @@ class QueryHandler:
             )
             logger.info(f"Analysis result: {analysis_result}")
         # Check if human agent is needed
-        recent_history = await chat_history.format_history_for_prompt()
+        recent_history = await chat_history.format_history_for_prompt(
+            'human_detection'
+        )
         needs_human = await self.services.human_handler._detect_human_request(
             message, recent_history
         )
@@ -133,10 +139,103 @@ class QueryHandler:
         
         return analysis_result, agent_decision
 
+    async def _lookup_response_cache(
+        self, query: str
+    ) -> Tuple[Optional[Tuple], Optional[ResponseResult]]:
+        """Returns the cache key of a query and the cached response, if any.
+
+        Errors only disable the cache for this query.
+        """
+        try:
+            hybrid_retriever = await self.services.get_hybrid_retriever()
+
+            def lookup():
+                cache_key = hybrid_retriever.context_fingerprint(query)
+                return cache_key, self.services.response_cache.get(*cache_key)
+
+            return await asyncio.to_thread(lookup)
+        except Exception as e:
+            logger.warning(f"Response cache lookup failed: {e}")
+            return None, None
+
+    async def _reason_and_retrieve(
+        self, query: str, msg_history: str
+    ) -> Tuple[bool, List]:
+        """Run the reasoning agent and, if it asks for it, the hybrid search.
+
+        Returns whether a search was needed and the search results for the
+        response agent.
+        """
+        reasoning_result = await self.reasoning_agent.run(
+            self.cfg.query_handler_prompts.reasoning_agent['user_prompt'].format(
+                query=query,
+                message_history=msg_history,
+                competitors=self.cfg.guardrails.competitors,
+            ),
+        )
+        logger.info(f"Reasoning result: {reasoning_result.data}")
+        need_search = reasoning_result.data.need_search
+        
+        if need_search:
+            hybrid_retriever = await self.services.get_hybrid_retriever()
+            all_search_results = await hybrid_retriever.search_many(
+                reasoning_result.data.expanded_query
+            )
+            logger.info(f"All search results: {all_search_results}")
+        else:
+            all_search_results = []
+        return need_search, all_search_results
+
+    async def _stream_response(
+        self, prompt: str, on_delta: Callable[[str], Awaitable[None]]
+    ) -> ResponseResult:
+        """Run the response agent, passing new text of the `response` field
+        to on_delta as it streams in.
+
+        The structured result arrives as streamed tool call arguments, which
+        are parsed as partial JSON on every update.
+        """
+        debounce = self.cfg.query_handler.get('stream_debounce_ms', 20) / 1000
+        sent = ''
+        async with self.response_agent.run_stream(prompt) as result:
+            async for message, _ in result.stream_structured(
+                debounce_by=debounce
+            ):
+                args = next(
+                    (part.args for part in message.parts
+                     if isinstance(part, ToolCallPart)),
+                    None
+                )
+                if isinstance(args, str):
+                    try:
+                        args = from_json(args, allow_partial='trailing-strings')
+                    except ValueError:
+                        continue
+                text = args.get('response') if isinstance(args, dict) else None
+                if isinstance(text, str) and text.startswith(sent) and (
+                    len(text) > len(sent)
+                ):
+                    await on_delta(text[len(sent):])
+                    sent = text
+            # stream_structured always ends with the complete message
+            result_data = await result.validate_structured_result(message)
+        if not result_data.response.strip():
+            raise ValueError("Response agent returned an empty response")
+        return result_data
+
     async def handle_query(
-        self, query: str, session_id: str, customer_id: str
+        self,
+        query: str,
+        session_id: str,
+        customer_id: str,
+        on_delta: Optional[Callable[[str], Awaitable[None]]] = None
     ) -> tuple[str, dict, str]:
-        """Main entry point for handling user queries."""
+        """Main entry point for handling user queries.
+
+        If on_delta is given, the bot response is streamed to it in pieces
+        while it is generated. The complete response is still returned and
+        saved to the chat history.
+        """
         try:
             session = await self.services.get_or_create_session(
                 session_id, customer_id
@@ -152,29 +251,66 @@ class QueryHandler:
                 return "Message forwarded to human agent"
 
             # For bot processing:
-            # Step 1: Analyze sentiment and check if should transfer to human
-            total_count = await chat_history.collection.count_documents(
-                {"session_id": session_id})
+            # In speculative mode, reasoning and retrieval start right away
+            # and run while sentiment analysis and transfer detection do
+            speculative_task = None
+            total_count = await chat_history.count_turns()
             logger.info(f"Current session message count: {total_count}")
-            analysis_result, agent_decision = await self.analyze_sentiment(   # need to handle is msg analyzer is None
-                session_id, customer_id, query, total_count)
-            
-            # Add message to chat history with metadata from analysis
-            if analysis_result:
-                metadata = {
-                    'sentiment_score': analysis_result.score,
-                    'sentiment_confidence': analysis_result.confidence,
-                    'full_analysis': analysis_result.full_analysis
-                }
-                await chat_history.add_turn(
-                    MessageRole.USER, query, metadata=metadata
+            # Looked up alongside, a hit skips the LLM calls below. Answers
+            # depend on the conversation so far and the customer details
+            # gathered in it, so only opening messages use the cache
+            cache_task = None
+            if (
+                self.services.response_cache is not None
+                and total_count == 0
+                and self.services.response_cache.accepts(query)
+            ):
+                cache_task = asyncio.create_task(
+                    self._lookup_response_cache(query)
                 )
-            else:
-                await chat_history.add_turn(MessageRole.USER, query)
-            logger.info(f"Analysis result: {analysis_result}")
-            logger.info(f"AgentDecision if transfer to human: {agent_decision}")
+            compute_start = time.perf_counter()
+            if self.cfg.query_handler.get('speculative_execution', False):
+                prior_history = await chat_history.format_history_for_prompt(
+                    'reasoning'
+                )
+                msg_history = "\n".join(
+                    filter(None, [prior_history, f"User: {query}"])
+                )
+                speculative_task = asyncio.create_task(
+                    self._reason_and_retrieve(query, msg_history)
+                )
+            try:
+                # Step 1: Analyze sentiment and check if should transfer to human
+                analysis_result, agent_decision = await self.analyze_sentiment(   # need to handle is msg analyzer is None
+                    session_id, customer_id, query, total_count)
+                
+                # Add message to chat history with metadata from analysis
+                if analysis_result:
+                    metadata = {
+                        'sentiment_score': analysis_result.score,
+                        'sentiment_confidence': analysis_result.confidence,
+                        'full_analysis': analysis_result.full_analysis
+                    }
+                    await chat_history.add_turn(
+                        MessageRole.USER, query, metadata=metadata
+                    )
+                else:
+                    await chat_history.add_turn(MessageRole.USER, query)
+                logger.info(f"Analysis result: {analysis_result}")
+                logger.info(f"AgentDecision if transfer to human: {agent_decision}")
+            except BaseException:
+                for task in (speculative_task, cache_task):
+                    if task is not None:
+                        task.cancel()
+                raise
             
             if agent_decision.should_transfer:
+                if cache_task is not None:
+                    cache_task.cancel()
+                if speculative_task is not None:
+                    # The bot will not answer, drop the speculative work
+                    speculative_task.cancel()
+                    logger.info("Cancelled speculative reasoning and retrieval")
                 success = await self.services.human_handler.transfer_to_human(
                     session_id,
                     agent_decision.transfer_reason
@@ -196,38 +332,53 @@ class QueryHandler:
                     )
                     return transfer_failed_msg
 
-            msg_history = await chat_history.format_history_for_prompt()
-
-            reasoning_result = await self.reasoning_agent.run(
-                self.cfg.query_handler_prompts.reasoning_agent['user_prompt'].format(
-                    query=query,
-                    message_history=msg_history,
-                    competitors=self.cfg.guardrails.competitors,
-                ),
+            cache_key, result_data = (
+                await cache_task if cache_task is not None else (None, None)
             )
-            logger.info(f"Reasoning result: {reasoning_result.data}")
-            need_search = reasoning_result.data.need_search
-            
-            if need_search:
-                all_search_results = []
-                for eq in reasoning_result.data.expanded_query:
-                    search_results = await self.services.hybrid_retriever.search(eq)
-                    all_search_results.append(search_results)
-                logger.info(f"All search results: {all_search_results}")
+            if result_data is not None:
+                if speculative_task is not None:
+                    speculative_task.cancel()
+                if on_delta is not None:
+                    await on_delta(result_data.response)
             else:
-                all_search_results = []
+                if speculative_task is not None:
+                    need_search, all_search_results = await speculative_task
+                else:
+                    msg_history = await chat_history.format_history_for_prompt(
+                        'reasoning'
+                    )
+                    need_search, all_search_results = (
+                        await self._reason_and_retrieve(query, msg_history)
+                    )
 
-            result = await self.response_agent.run(
-                self.cfg.query_handler_prompts.response_agent['user_prompt'].format(
+                response_history = (
+                    await chat_history.format_history_for_prompt('response')
+                )
+                response_prompt = self.cfg.query_handler_prompts.response_agent['user_prompt'].format(
                     query=query,
-                    message_history=msg_history,
+                    message_history=response_history,
                     search_results=all_search_results,
                     competitors=self.cfg.guardrails.competitors,
                 )
-            )
-            response = result.data.response
-            intent = result.data.intent
-            rag_result_used = result.data.rag_result_used
+                if on_delta is not None:
+                    result_data = await self._stream_response(
+                        response_prompt, on_delta
+                    )
+                else:
+                    result_data = (
+                        await self.response_agent.run(response_prompt)
+                    ).data
+                # Only answers grounded in retrieved context are reusable
+                if cache_key is not None and need_search:
+                    self.services.response_cache.put(
+                        query,
+                        *cache_key,
+                        result_data,
+                        time.perf_counter() - compute_start
+                    )
+            response = result_data.response
+            intent = result_data.intent
+            rag_result_used = result_data.rag_result_used
             logger.info(f"Intent: {intent}, "
                         f"RAG Result used: {rag_result_used}"
                         f", Response: {response}")
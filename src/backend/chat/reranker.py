@@ -0,0 +1,192 @@
+"""Loads the CrossEncoder reranker and runs it off the event loop.
+
+Rerank requests from concurrent chat sessions are collected for a short
+window and scored with a single predict call in a worker thread, so one
+rerank no longer blocks every other websocket and the CPU model sees larger,
+more efficient batches.
+"""
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import torch
+from sentence_transformers import CrossEncoder
+
+logger = logging.getLogger(__name__)
+
+_loaded_models: Dict[Tuple, CrossEncoder] = {}
+_models_lock = threading.Lock()
+
+
+def load_cross_encoder(
+    model_name: str,
+    backend: str = "torch",
+    onnx_dir: str = "./data/models/reranker_onnx",
+    quantization_config: str = "avx2",
+    intra_op_threads: Optional[int] = None
+) -> CrossEncoder:
+    """Load the reranker model with the configured inference backend.
+
+    Args:
+        model_name: Hugging Face name of the CrossEncoder
+        backend: "torch" for the original model, "onnx" for an ONNX export
+            with dynamic int8 quantization, for CPU-only deployments
+        onnx_dir: Where the quantized ONNX export is cached
+        quantization_config: "arm64", "avx2", "avx512" or "avx512_vnni"
+        intra_op_threads: ONNX Runtime intra-op threads, None for default
+
+    Models are cached per process, so every retriever in the process shares
+    one copy of the weights.
+    """
+    key = (model_name, backend, onnx_dir, quantization_config, intra_op_threads)
+    with _models_lock:
+        if key not in _loaded_models:
+            if backend == "torch":
+                _loaded_models[key] = CrossEncoder(model_name)
+            elif backend == "onnx":
+                _loaded_models[key] = _load_quantized_onnx_cross_encoder(
+                    model_name, onnx_dir, quantization_config, intra_op_threads
+                )
+            else:
+                raise ValueError(f"Unsupported reranker backend: {backend}")
+        return _loaded_models[key]
+
+
+def _load_quantized_onnx_cross_encoder(
+    model_name: str,
+    onnx_dir: str,
+    quantization_config: str,
+    intra_op_threads: Optional[int]
+) -> CrossEncoder:
+    try:
+        import onnxruntime as ort
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+    except ImportError as e:
+        raise ImportError(
+            "reranker_backend 'onnx' requires optimum with onnxruntime: "
+            "pip install optimum[onnxruntime]"
+        ) from e
+    export_dir = os.path.join(onnx_dir, model_name.replace("/", "__"))
+    file_name = f"onnx/model_qint8_{quantization_config}.onnx"
+    if not os.path.exists(os.path.join(export_dir, file_name)):
+        logger.info(f"Exporting {model_name} to quantized ONNX in {export_dir}")
+        model = CrossEncoder(model_name, backend="onnx")
+        model.save_pretrained(export_dir)
+        export_dynamic_quantized_onnx_model(
+            model, quantization_config, export_dir
+        )
+    session_options = ort.SessionOptions()
+    if intra_op_threads:
+        session_options.intra_op_num_threads = intra_op_threads
+    logger.info(f"Loading quantized ONNX reranker {export_dir}/{file_name}")
+    return CrossEncoder(
+        export_dir,
+        backend="onnx",
+        model_kwargs={
+            "file_name": file_name,
+            "provider": "CPUExecutionProvider",
+            "session_options": session_options,
+        }
+    )
+
+
+class BatchingReranker:
+    def __init__(
+        self,
+        model,
+        batch_window_ms: float = 5,
+        max_batch_size: int = 128,
+        max_workers: int = 1
+    ):
+        self.model = model
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch_size = max_batch_size
+        # torch releases the GIL inside the model, so threads are enough
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="reranker"
+        )
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._max_workers = max_workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def _ensure_worker(self) -> None:
+        """Start the batching task on the running event loop"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self._max_workers)
+            self._worker = asyncio.create_task(self._collect_batches())
+
+    def submit(self, pairs: List[Tuple[str, str]]) -> asyncio.Future:
+        """Queue (query, document) pairs, returns a future of their scores"""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        if not pairs:
+            future.set_result([])
+        else:
+            self._queue.put_nowait((pairs, future))
+        return future
+
+    async def predict(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        return await self.submit(pairs)
+
+    async def _collect_batches(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.batch_window
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+            batch = [
+                (pairs, future) for pairs, future in batch
+                if not future.cancelled()
+            ]
+            if not batch:
+                continue
+            # Keep collecting the next batch while this one runs
+            await self._slots.acquire()
+            asyncio.create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch: List[Tuple[List, asyncio.Future]]) -> None:
+        all_pairs = [pair for pairs, _ in batch for pair in pairs]
+        try:
+            scores = await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._predict, all_pairs
+            )
+        except Exception as e:
+            logger.error(f"Reranker batch of {len(all_pairs)} pairs failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+        logger.info(f"Reranked {len(all_pairs)} pairs for "
+                    f"{len(batch)} requests in one batch")
+        offset = 0
+        for pairs, future in batch:
+            if not future.done():
+                future.set_result(scores[offset:offset + len(pairs)])
+            offset += len(pairs)
+
+    def _predict(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        with torch.no_grad():
+            scores = self.model.predict(pairs)
+        return [float(score) for score in scores]
+
+    def close(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,160 @@
+"""Semantic cache of bot responses for frequently asked questions.
+
+An entry matches when a new query's embedding is close enough to a cached
+query's embedding and the retrieval context (a hash of the chunk ids a
+vector search returns for the query) is the same. Chunk ids are content
+hashes, so edited context changes the hash. The cache is cleared when the
+collection version changes, e.g. after an ingestion run.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedResponse:
+    query: str
+    embedding: np.ndarray
+    context_hash: str
+    result: Any
+    created: float
+    compute_seconds: float
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        similarity_threshold: float = 0.95,
+        ttl_seconds: Optional[float] = 86400,
+        max_size: int = 1000,
+        min_query_length: int = 10,
+        version_fn: Optional[Callable[[], Any]] = None,
+        version_check_seconds: float = 60
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.min_query_length = min_query_length
+        self.version_fn = version_fn
+        self.version_check_seconds = version_check_seconds
+        self._entries: List[CachedResponse] = []
+        # Unit-length embeddings of the entries, one row per entry
+        self._matrix: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.invalidations = 0
+        self.seconds_saved = 0.0
+
+    def accepts(self, query: str) -> bool:
+        """Whether a query is worth looking up and caching"""
+        return len(query.strip()) >= self.min_query_length
+
+    @staticmethod
+    def _unit(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self) -> None:
+        """Clear the cache if the collection changed since the last check
+
+        version_fn may read the whole collection, so it runs outside the
+        lock, at most every version_check_seconds.
+        """
+        if self.version_fn is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now - self._version_checked < self.version_check_seconds:
+                return
+            self._version_checked = now
+        version = self.version_fn()
+        with self._lock:
+            if self._version is not None and version != self._version:
+                logger.info(f"Collection changed ({self._version} -> "
+                            f"{version}), clearing {len(self._entries)} "
+                            f"cached responses")
+                self._entries = []
+                self._matrix = None
+                self.invalidations += 1
+            self._version = version
+
+    def _expire(self) -> None:
+        if self.ttl_seconds is None:
+            return
+        cutoff = time.time() - self.ttl_seconds
+        if self._entries and self._entries[0].created < cutoff:
+            self._entries = [e for e in self._entries if e.created >= cutoff]
+            self._matrix = None
+
+    def get(self, embedding, context_hash: str) -> Optional[Any]:
+        """Cached result for a similar query with the same context, call it
+        from a worker thread"""
+        self._check_version()
+        with self._lock:
+            self._expire()
+            if self._entries:
+                if self._matrix is None:
+                    self._matrix = np.stack(
+                        [entry.embedding for entry in self._entries]
+                    )
+                similarities = self._matrix @ self._unit(embedding)
+                for index in np.argsort(-similarities):
+                    if similarities[index] < self.similarity_threshold:
+                        break
+                    entry = self._entries[index]
+                    if entry.context_hash == context_hash:
+                        self.hits += 1
+                        self.seconds_saved += entry.compute_seconds
+                        logger.info(f"Response cache hit "
+                                    f"({similarities[index]:.3f}) for cached "
+                                    f"query '{entry.query}'")
+                        return entry.result
+            self.misses += 1
+            return None
+
+    def put(
+        self,
+        query: str,
+        embedding,
+        context_hash: str,
+        result: Any,
+        compute_seconds: float
+    ) -> None:
+        # Versions are checked on lookup, which precedes every put
+        with self._lock:
+            # Entries are kept in insertion order, so the oldest goes first
+            if len(self._entries) >= self.max_size:
+                self._entries = self._entries[1:]
+            self._entries.append(CachedResponse(
+                query=query,
+                embedding=self._unit(embedding),
+                context_hash=context_hash,
+                result=result,
+                created=time.time(),
+                compute_seconds=compute_seconds
+            ))
+            self._matrix = None
+            self.stores += 1
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'invalidations': self.invalidations,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'seconds_saved': round(self.seconds_saved, 3),
+        }
@@ -1,6 +1,10 @@
-from datetime import datetime
+import asyncio
+from datetime import datetime, timedelta
 import logging
+from typing import Callable, Dict
 from uuid import uuid4
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from src.backend.database.mongodb_client import MongoDBClient
 from src.backend.chat.hybrid_retriever import HybridRetriever
 from src.backend.chat.sentiment_analyzer import SentimentAnalyzer
@@ -8,35 +12,97 @@ from src.backend.chat.msg_analyzer import MessageAnalyzer
 from src.backend.chat.human_agent_handler import HumanAgentHandler
 from src.backend.chat.query_handler import QueryHandler
 from src.backend.chat.chat_history import ChatHistory
+from src.backend.chat.history_writer import ChatHistoryWriter
+from src.backend.chat.session_cache import SessionCache
+from src.backend.chat.response_cache import ResponseCache
 from src.backend.models.human_agent import AgentType, ChatSession
 from src.backend.utils.settings import SETTINGS
+from src.backend.utils.client_registry import close_clients, configure_http_pool
 
 
 logger = logging.getLogger(__name__)
 
+# Indexes behind the history and session lookups done per message
+CHAT_HISTORY_INDEXES = [
+    IndexModel([('session_id', ASCENDING), ('timestamp', DESCENDING)]),
+    IndexModel([('customer_id', ASCENDING), ('timestamp', DESCENDING)]),
+]
+SESSION_INDEXES = [
+    IndexModel([('session_id', ASCENDING)]),
+    IndexModel([('customer_id', ASCENDING), ('last_interaction', DESCENDING)]),
+    # At most one active session per customer, see _resolve_customer_session
+    IndexModel(
+        [('customer_id', ASCENDING), ('active', ASCENDING)],
+        unique=True,
+        partialFilterExpression={'active': True}
+    ),
+]
+
 
 class ServiceContainer:
     """Container for all service instances with centralized initialization."""
     
     def __init__(self, cfg):
         self.cfg = cfg
+        # Before any component creates a provider client
+        configure_http_pool(cfg.get('http_pool'))
         self.mongodb_client = None
         self.db = None
         self.sessions_collection = None
         self.chat_history_collection = None
+        self.history_writer = None
         self.hybrid_retriever = None
         self.sentiment_analyzer = None
         self.message_analyzer = None
         self.human_handler = None
         self.query_handler = None
-        self.chat_histories = {}
-        self.active_sessions = {}
+        self.response_cache = None
+        # Bounded, idle sessions are persisted and evicted after the session
+        # timeout and loaded from MongoDB again on access
+        services_cfg = cfg.get('services', {})
+        session_ttl = cfg.mongodb.get('timeout_hours', 24) * 3600
+        sweep_interval = services_cfg.get('session_sweep_interval_seconds', 60)
+        self.active_sessions = SessionCache(
+            'active_sessions',
+            max_size=services_cfg.get('session_cache_size', 10000),
+            ttl_seconds=session_ttl,
+            on_evict=self._persist_evicted_session,
+            sweep_interval_seconds=sweep_interval,
+            # customer_id -> most recently used session of the customer
+            index_by=lambda session: session.customer_id,
+            # Listed to staff until transferred back, however long idle
+            keep=lambda session: session.current_agent == AgentType.HUMAN
+        )
+        self.chat_histories = SessionCache(
+            'chat_histories',
+            max_size=services_cfg.get('session_cache_size', 10000),
+            ttl_seconds=session_ttl,
+            sweep_interval_seconds=sweep_interval
+        )
+        # Readiness per component: not_loaded, loading, ready or failed
+        self.component_status: Dict[str, str] = {
+            'mongodb': 'not_loaded',
+            'hybrid_retriever': 'not_loaded',
+            'sentiment_analyzer': 'not_loaded',
+        }
+        self._component_tasks: Dict[str, asyncio.Task] = {}
+        self._warmup_task = None
+        self._index_task = None
         
     async def initialize(self):
-        """Initialize all service components with proper dependency order."""
+        """Initialize all service components with proper dependency order.
+
+        With services.lazy_init, the heavy components (retriever with its
+        reranker weights, sentiment analyzer) are not loaded here but on first
+        use or by a background warmup task, so the API can start serving
+        health checks right away.
+        """
+        services_cfg = self.cfg.get('services', {})
         try:
+            self.component_status['mongodb'] = 'loading'
             self.mongodb_client = MongoDBClient(SETTINGS.MONGODB_URI)
             await self.mongodb_client.connect()
+            self.component_status['mongodb'] = 'ready'
             self.db = self.mongodb_client.client[self.cfg.mongodb.db_name]
             self.chat_history_collection = self.db[
                 self.cfg.mongodb.chat_history_collection
@@ -44,14 +110,181 @@ class ServiceContainer:
             self.sessions_collection = self.db[
                 self.cfg.mongodb.session_collection
             ]
-            self.hybrid_retriever = HybridRetriever(self.cfg)
-            self.sentiment_analyzer = SentimentAnalyzer(self.cfg)
+            if self.cfg.mongodb.get('ensure_indexes', True):
+                # Index builds on large collections can take a while, so
+                # they do not hold up startup
+                self._index_task = asyncio.create_task(self.ensure_indexes())
+            history_cfg = self.cfg.get('chat_history', {})
+            if history_cfg.get('write_behind', False):
+                self.history_writer = ChatHistoryWriter(
+                    self.chat_history_collection,
+                    flush_interval_ms=history_cfg.get('flush_interval_ms', 50),
+                    max_batch_size=history_cfg.get('max_batch_size', 100),
+                    max_retries=history_cfg.get('max_write_retries', 3),
+                    max_retry_delay_ms=history_cfg.get(
+                        'max_retry_delay_ms', 5000
+                    )
+                )
+            cache_cfg = self.cfg.query_handler.get('response_cache', {})
+            if cache_cfg.get('enabled', False):
+                self.response_cache = ResponseCache(
+                    similarity_threshold=cache_cfg.get(
+                        'similarity_threshold', 0.95
+                    ),
+                    ttl_seconds=cache_cfg.get('ttl_seconds', 86400),
+                    max_size=cache_cfg.get('max_size', 1000),
+                    min_query_length=cache_cfg.get('min_query_length', 10),
+                    version_fn=lambda: (
+                        self.hybrid_retriever.collection_version()
+                        if self.hybrid_retriever else None
+                    ),
+                    version_check_seconds=cache_cfg.get(
+                        'version_check_seconds', 60
+                    )
+                )
+            self.active_sessions.start()
+            self.chat_histories.start()
             self.message_analyzer = MessageAnalyzer(self)
             self.human_handler = HumanAgentHandler(self)
             self.query_handler = QueryHandler(self)
+            if not services_cfg.get('lazy_init', False):
+                await self.warmup()
+            elif services_cfg.get('background_warmup', True):
+                self._warmup_task = asyncio.create_task(self.warmup())
+                self._warmup_task.add_done_callback(self._on_warmup_done)
         except Exception as e:
+            if self.component_status['mongodb'] == 'loading':
+                self.component_status['mongodb'] = 'failed'
             logger.error(f"Error initializing services: {e}")
             raise
+
+    async def _persist_evicted_session(
+        self, session_id: str, session: ChatSession
+    ) -> None:
+        """Save in-memory session state before the session is evicted"""
+        chat_history = self.chat_histories.pop(session_id, None)
+        if chat_history is not None and (
+            chat_history.cached_message_count is not None
+        ):
+            session.message_count = chat_history.cached_message_count
+        if self.sessions_collection is None:
+            return
+        current_agent = getattr(
+            session.current_agent, 'value', session.current_agent
+        )
+        await self.sessions_collection.update_one(
+            {"session_id": session_id},
+            {"$set": {
+                "current_agent": str(current_agent).upper(),
+                "message_count": session.message_count,
+                "last_interaction": session.last_interaction
+            }}
+        )
+        logger.info(f"Persisted and evicted idle session {session_id}")
+
+    async def ensure_indexes(self) -> None:
+        """Create the chat_history and sessions indexes, then check that the
+        per-message queries use them.
+        """
+        try:
+            await self.mongodb_client.ensure_indexes(
+                self.chat_history_collection, CHAT_HISTORY_INDEXES
+            )
+            await self.mongodb_client.ensure_indexes(
+                self.sessions_collection, SESSION_INDEXES
+            )
+            if not self.cfg.mongodb.get('check_query_plans', True):
+                return
+            await self.mongodb_client.warn_on_collection_scans(
+                self.chat_history_collection,
+                [
+                    ({'customer_id': '', 'session_id': ''},
+                     [('timestamp', DESCENDING)]),
+                    ({'customer_id': ''}, [('timestamp', DESCENDING)]),
+                    ({'session_id': ''}, None),
+                ]
+            )
+            await self.mongodb_client.warn_on_collection_scans(
+                self.sessions_collection,
+                [
+                    ({'session_id': ''}, None),
+                    ({'customer_id': ''}, [('last_interaction', DESCENDING)]),
+                ]
+            )
+        except Exception as e:
+            logger.warning(f"Could not ensure MongoDB indexes: {e}")
+
+    def _create_hybrid_retriever(self) -> HybridRetriever:
+        hybrid_retriever = HybridRetriever(self.cfg)
+        hybrid_retriever.build_keyword_index()
+        return hybrid_retriever
+
+    async def _load_component(self, name: str, factory: Callable):
+        """Load a heavy component once, in a worker thread.
+
+        Concurrent callers share the same loading task. A failed load is
+        retried by the next caller.
+        """
+        component = getattr(self, name)
+        if component is not None:
+            return component
+        task = self._component_tasks.get(name)
+        if task is None:
+            task = asyncio.create_task(self._build_component(name, factory))
+            self._component_tasks[name] = task
+        return await asyncio.shield(task)
+
+    async def _build_component(self, name: str, factory: Callable):
+        self.component_status[name] = 'loading'
+        logger.info(f"Loading {name}")
+        try:
+            component = await asyncio.to_thread(factory)
+        except Exception as e:
+            self.component_status[name] = 'failed'
+            self._component_tasks.pop(name, None)
+            logger.error(f"Error loading {name}: {e}")
+            raise
+        setattr(self, name, component)
+        self.component_status[name] = 'ready'
+        logger.info(f"{name} ready")
+        return component
+
+    async def get_hybrid_retriever(self) -> HybridRetriever:
+        return await self._load_component(
+            'hybrid_retriever', self._create_hybrid_retriever
+        )
+
+    async def get_sentiment_analyzer(self) -> SentimentAnalyzer:
+        return await self._load_component(
+            'sentiment_analyzer', lambda: SentimentAnalyzer(self.cfg)
+        )
+
+    async def warmup(self) -> None:
+        """Load all heavy components concurrently"""
+        await asyncio.gather(
+            self.get_hybrid_retriever(),
+            self.get_sentiment_analyzer()
+        )
+
+    def _on_warmup_done(self, task: asyncio.Task) -> None:
+        """Log a failed background warm-up, components it did not get to
+        load are reported as failed"""
+        if task.cancelled() or task.exception() is None:
+            return
+        logger.error("Background warm-up failed",
+                     exc_info=task.exception())
+        for name, status in self.component_status.items():
+            if status == 'not_loaded':
+                self.component_status[name] = 'failed'
+
+    def readiness(self) -> Dict:
+        """Readiness state of each component, for health checks"""
+        return {
+            'ready': all(
+                status == 'ready' for status in self.component_status.values()
+            ),
+            'components': dict(self.component_status),
+        }
     
     async def get_chat_history(self, session_id: str, customer_id: str):
         """Get or create chat history for a session."""
@@ -61,7 +294,11 @@ class ServiceContainer:
                 self.cfg,
                 session_id,
                 customer_id,
-                collection=self.chat_history_collection
+                collection=self.chat_history_collection,
+                writer=self.history_writer,
+                ring_buffer_size=self.cfg.get('chat_history', {}).get(
+                    'ring_buffer_size', 50
+                )
             )
         return self.chat_histories[session_id]
     
@@ -131,59 +368,112 @@ class ServiceContainer:
                     f"customer {customer_id}")
         return session
     
-    async def check_session(self, customer_id: str) -> str:
-        """Check if a recent active session exists for a customer.
-        
-        Returns existing session_id if found, otherwise creates a new one.
-        """
-        # Get timeout from config or use default
-        session_timeout_hours = (
+    def _session_timeout_hours(self) -> float:
+        return (
             self.cfg.mongodb.timeout_hours
             if hasattr(self.cfg.mongodb, 'timeout_hours')
             else 24
         )
-        
-        # First check MongoDB for recent sessions
+
+    async def _resolve_customer_session(self, customer_id: str) -> ChatSession:
+        """Most recent unexpired session of a customer, or a new one.
+
+        Cached sessions are found through the customer index without a
+        database call. Otherwise a single find_one_and_update either
+        returns the customer's recent session from MongoDB (refreshing its
+        last_interaction) or inserts a new session.
+
+        Inserted sessions are marked active, and a unique index allows one
+        active session per customer, so concurrent calls that both insert
+        end up with the same session. Expired sessions are marked inactive
+        first.
+        """
+        cutoff = datetime.now() - timedelta(
+            hours=self._session_timeout_hours()
+        )
+        session_id = self.active_sessions.lookup(customer_id)
+        if session_id is not None:
+            session = self.active_sessions[session_id]
+            if session.last_interaction > cutoff:
+                session.last_interaction = datetime.now()
+                logger.info(f"Found recent active session {session_id} "
+                            f"for customer {customer_id}")
+                return session
+
         if self.mongodb_client and self.mongodb_client.client:
-            db_session = await self.sessions_collection.find_one(
-                {"customer_id": customer_id},
-                sort=[("last_interaction", -1)] # Sort by last interaction in descending order
+            now = datetime.now()
+            sessions = self.sessions_collection
+            await sessions.update_many(
+                {
+                    "customer_id": customer_id,
+                    "active": True,
+                    "last_interaction": {"$lte": cutoff}
+                },
+                {"$set": {"active": False}}
             )
-            
-            if db_session:
-                last_interaction = db_session.get("last_interaction")
-                if last_interaction:
-                    hours_since_last = (
-                        (datetime.now() - last_interaction)
-                        .total_seconds() / 3600
-                    )
-                    if hours_since_last < session_timeout_hours:
-                        session_id = db_session["session_id"]
-                        logger.info(
-                            f"Found recent session {session_id} in database "
-                            f" for customer {customer_id}"
-                        )
-                        return session_id
-        
-        # if no valid session is found, check active sessions in memory
-        for session_id, session in self.active_sessions.items():
-            if session.customer_id == customer_id:
-                hours_since_last = (
-                    (datetime.now() - session.last_interaction)
-                    .total_seconds() / 3600
+            recent = {
+                "customer_id": customer_id,
+                "last_interaction": {"$gt": cutoff}
+            }
+            touch = {"$set": {"last_interaction": now}}
+            try:
+                db_session = await sessions.find_one_and_update(
+                    recent,
+                    {
+                        **touch,
+                        "$setOnInsert": {
+                            "session_id": f"session-{uuid4()}",
+                            "current_agent": "BOT",
+                            "start_time": now,
+                            "message_count": 0,
+                            "active": True
+                        }
+                    },
+                    sort=[("last_interaction", DESCENDING)],
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
                 )
-                if hours_since_last < session_timeout_hours:
-                    logger.info(
-                    f"Found recent active session {session_id} "
-                    f"for customer {customer_id}"
-                    )
-                    return session_id
-        
-        # Create new session ID if none found
-        new_session_id = f"session-{uuid4()}"
+            except DuplicateKeyError:
+                # A concurrent call inserted the customer's session first
+                db_session = await sessions.find_one_and_update(
+                    recent,
+                    touch,
+                    sort=[("last_interaction", DESCENDING)],
+                    return_document=ReturnDocument.AFTER
+                )
+                if db_session is None:
+                    raise
+            session_id = db_session["session_id"]
+            session = self.active_sessions.get(session_id)
+            if session is None:
+                session = ChatSession(
+                    session_id=session_id,
+                    customer_id=customer_id,
+                    current_agent=db_session.get(
+                        "current_agent", "bot"
+                    ).lower(),
+                    start_time=db_session.get("start_time", now),
+                    last_interaction=now,
+                    message_count=db_session.get("message_count", 0)
+                )
+                self.active_sessions[session_id] = session
+            logger.info(f"Resolved session {session_id} in database "
+                        f"for customer {customer_id}")
+            return session
+
+        # Without MongoDB, sessions only live in memory
+        session_id = f"session-{uuid4()}"
         logger.info(f"No recent session found, creating new session ID "
-                    f"{new_session_id} for customer {customer_id}")
-        return new_session_id
+                    f"{session_id} for customer {customer_id}")
+        return await self.get_or_create_session(session_id, customer_id)
+
+    async def check_session(self, customer_id: str) -> str:
+        """Check if a recent active session exists for a customer.
+        
+        Returns existing session_id if found, otherwise creates a new one.
+        """
+        session = await self._resolve_customer_session(customer_id)
+        return session.session_id
 
     async def create_new_session(self, customer_id: str = None) -> dict:
         """Create a new session and return its details.
@@ -193,10 +483,9 @@ class ServiceContainer:
         # Generate customer ID if not provided (for demo purposes)
         if not customer_id:
             customer_id = f"customer-{uuid4().hex[:8]}"
-        session_id = await self.check_session(customer_id)
-        session = await self.get_or_create_session(session_id, customer_id)
+        session = await self._resolve_customer_session(customer_id)
         return {
-            "session_id": session_id,
+            "session_id": session.session_id,
             "customer_id": customer_id,
             "current_agent": session.current_agent,
             "start_time": session.start_time,
@@ -206,6 +495,25 @@ class ServiceContainer:
 
     async def cleanup(self):
         """Cleanup all resources."""
+        if self._warmup_task and not self._warmup_task.done():
+            self._warmup_task.cancel()
+        if self._index_task and not self._index_task.done():
+            self._index_task.cancel()
+        if self.hybrid_retriever:
+            self.hybrid_retriever.close()
+        await close_clients()
+        if self.response_cache:
+            logger.info(f"Response cache stats: {self.response_cache.stats()}")
+        # Session state is saved while the MongoDB client is still open
+        await self.active_sessions.close()
+        await self.chat_histories.close(evict_all=False)
+        if self.history_writer:
+            # Queued turns must reach MongoDB before the client closes
+            try:
+                await self.history_writer.close()
+            except Exception:
+                logger.exception("Could not write queued chat turns "
+                                  "on shutdown")
         if self.mongodb_client:
             await self.mongodb_client.cleanup()
         # Clear dictionaries
@@ -0,0 +1,172 @@
+"""Bounded in-memory cache for per-session state.
+
+Entries are evicted least recently used first once the cache is full, and
+by a background sweeper once they have been idle for longer than the TTL.
+An optional async on_evict callback runs for every evicted entry, e.g. to
+persist session state, so evicted entries can be loaded again on access.
+With index_by, a secondary index maps e.g. a customer_id to the key of the
+most recently used entry of that customer. Entries for which keep(value) is
+true, e.g. sessions handled by a human agent, are never evicted.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import (
+    Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set
+)
+
+logger = logging.getLogger(__name__)
+
+
+class SessionCache(MutableMapping):
+    def __init__(
+        self,
+        name: str,
+        max_size: int = 10000,
+        ttl_seconds: Optional[float] = None,
+        on_evict: Optional[Callable[[Hashable, Any], Awaitable[None]]] = None,
+        sweep_interval_seconds: float = 60,
+        index_by: Optional[Callable[[Any], Hashable]] = None,
+        keep: Optional[Callable[[Any], bool]] = None
+    ):
+        self.name = name
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.on_evict = on_evict
+        self.sweep_interval = sweep_interval_seconds
+        # key -> (value, last access time), least recently used first
+        self._entries: "OrderedDict[Hashable, List]" = OrderedDict()
+        self._sweeper: Optional[asyncio.Task] = None
+        self._evictions: Set[asyncio.Task] = set()
+        self.evicted = 0
+        self.index_by = index_by
+        self._index: Dict[Hashable, Hashable] = {}
+        self.keep = keep
+
+    def _evictable(self, value) -> bool:
+        return self.keep is None or not self.keep(value)
+
+    def _reindex(self, key, value) -> None:
+        if self.index_by is not None:
+            self._index[self.index_by(value)] = key
+
+    def _unindex(self, key, value) -> None:
+        if self.index_by is not None:
+            secondary = self.index_by(value)
+            if self._index.get(secondary) == key:
+                del self._index[secondary]
+
+    def __getitem__(self, key):
+        entry = self._entries[key]
+        entry[1] = time.monotonic()
+        self._entries.move_to_end(key)
+        self._reindex(key, entry[0])
+        return entry[0]
+
+    def __setitem__(self, key, value) -> None:
+        self._entries[key] = [value, time.monotonic()]
+        self._entries.move_to_end(key)
+        self._reindex(key, value)
+        while len(self._entries) > self.max_size:
+            old_key = next(
+                (k for k, (v, _) in self._entries.items()
+                 if self._evictable(v)),
+                None
+            )
+            if old_key is None:
+                break
+            old_value = self._entries[old_key][0]
+            del self[old_key]
+            self._evict(old_key, old_value)
+
+    def __delitem__(self, key) -> None:
+        value, _ = self._entries.pop(key)
+        self._unindex(key, value)
+
+    def __contains__(self, key) -> bool:
+        # Membership checks do not count as an access
+        return key in self._entries
+
+    def __iter__(self):
+        return iter(list(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def peek(self, key, default=None):
+        """Value for key without refreshing its recency"""
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else default
+
+    def lookup(self, secondary: Hashable) -> Optional[Hashable]:
+        """Key of the most recently used entry for a secondary index value"""
+        return self._index.get(secondary)
+
+    def values(self) -> List:
+        return [value for value, _ in self._entries.values()]
+
+    def items(self) -> List:
+        return [(key, entry[0]) for key, entry in self._entries.items()]
+
+    def _evict(self, key, value) -> None:
+        self.evicted += 1
+        if self.on_evict is None:
+            return
+        task = asyncio.get_running_loop().create_task(
+            self._run_on_evict(key, value)
+        )
+        self._evictions.add(task)
+        task.add_done_callback(self._evictions.discard)
+
+    async def _run_on_evict(self, key, value) -> None:
+        try:
+            await self.on_evict(key, value)
+        except Exception as e:
+            logger.error(f"Error evicting {key} from {self.name}: {e}")
+
+    def start(self) -> None:
+        """Start the idle sweeper on the running event loop"""
+        if self.ttl_seconds and (self._sweeper is None or self._sweeper.done()):
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def _sweep_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            await self.sweep()
+
+    async def sweep(self) -> int:
+        """Evict entries idle for longer than the TTL"""
+        if not self.ttl_seconds:
+            return 0
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = []
+        # Least recently used first, so stop at the first fresh entry
+        for key, (value, accessed) in self._entries.items():
+            if accessed > cutoff:
+                break
+            if self._evictable(value):
+                expired.append((key, value))
+        for key, value in expired:
+            del self[key]
+            self._evict(key, value)
+        if self._evictions:
+            await asyncio.gather(*list(self._evictions))
+        if expired:
+            logger.info(f"Evicted {len(expired)} idle entries from "
+                        f"{self.name}, {len(self._entries)} left")
+        return len(expired)
+
+    async def close(self, evict_all: bool = True) -> None:
+        """Stop the sweeper, optionally running on_evict for every entry"""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        if evict_all:
+            for key, value in self.items():
+                self._evict(key, value)
+            self._entries.clear()
+            self._index.clear()
+        if self._evictions:
+            await asyncio.gather(*list(self._evictions))
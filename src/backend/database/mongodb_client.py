@@ -1,5 +1,7 @@
 import logging
+from typing import Dict, List, Optional, Tuple
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel
 from pymongo.errors import ServerSelectionTimeoutError, ConnectionFailure
 import re
 import asyncio
@@ -67,4 +69,47 @@ class MongoDBClient:
         """Cleanup resources"""
         if self.client:
             self.client.close()
-            self.client = None
\ No newline at end of file
+            self.client = None
+
+    async def ensure_indexes(
+        self, collection, indexes: List[IndexModel]
+    ) -> List[str]:
+        """Create indexes that do not exist yet, existing ones are kept"""
+        names = await collection.create_indexes(indexes)
+        logger.info(f"Ensured indexes on {collection.name}: {names}")
+        return names
+
+    @staticmethod
+    def _plan_stages(plan: Dict) -> List[str]:
+        """All stage names of an explain() plan tree"""
+        stages = [plan['stage']] if 'stage' in plan else []
+        children = [plan[key] for key in ('inputStage', 'queryPlan')
+                    if key in plan]
+        children.extend(plan.get('inputStages', []))
+        for child in children:
+            stages.extend(MongoDBClient._plan_stages(child))
+        return stages
+
+    async def warn_on_collection_scans(
+        self,
+        collection,
+        queries: List[Tuple[Dict, Optional[List[Tuple[str, int]]]]]
+    ) -> List[Dict]:
+        """Explain (filter, sort) queries, warn about collection scans.
+
+        Returns the filters whose winning plan scans the collection.
+        """
+        scanning = []
+        for query_filter, sort in queries:
+            cursor = collection.find(query_filter)
+            if sort:
+                cursor = cursor.sort(sort)
+            explanation = await cursor.limit(1).explain()
+            winning_plan = explanation.get('queryPlanner', {}).get(
+                'winningPlan', {}
+            )
+            if 'COLLSCAN' in self._plan_stages(winning_plan):
+                logger.warning(f"Query {query_filter} sorted by {sort} on "
+                               f"{collection.name} scans the collection")
+                scanning.append(query_filter)
+        return scanning
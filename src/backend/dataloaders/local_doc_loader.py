@@ -1,14 +1,21 @@
-from typing import Dict, Union, List
+from typing import Callable, Dict, Optional, Tuple, Union, List
 import os
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import pypdf
 import pandas as pd
 from omegaconf import DictConfig
 from dataclasses import dataclass
+from src.backend.dataloaders.sheet_cache import read_workbook
 
 
 logger = logging.getLogger(__name__)
 
+# Worker processes of ParallelDocLoader unless configured
+DEFAULT_MAX_WORKERS = 4
+
 
 @dataclass(frozen=True)
 class LoadedUnstructuredDocument:
@@ -24,86 +31,79 @@ class LoadedStructuredDocument:
     metadata: Dict[str, str]
 
 
+def _pdf_page_count(file_path: str) -> int:
+    with open(file_path, 'rb') as file:
+        return len(pypdf.PdfReader(file).pages)
+
+
+def _extract_pdf_pages(
+    file_path: str, start: int, stop: int
+) -> List[Tuple[int, Optional[str]]]:
+    """Text of pages [start, stop) as (1-based page number, text) pairs
+
+    A module-level function, so it can run in a worker process.
+    """
+    pages = []
+    with open(file_path, 'rb') as file:
+        pdf = pypdf.PdfReader(file)
+        for i in range(start, stop):
+            try:
+                text = pdf.pages[i].extract_text()
+            except Exception as e:
+                logger.warning(f"Error reading page {i + 1} of "
+                               f"PDF {file_path}: {str(e)}")
+                text = None
+            pages.append((i + 1, text))
+    return pages
+
+
+def _load_path(
+    cfg: DictConfig, path_cfg: DictConfig
+) -> List[Union[LoadedUnstructuredDocument, LoadedStructuredDocument]]:
+    """Load one configured path, in a worker process"""
+    loaded_docs = LocalDocLoader()._load_document(cfg, path_cfg)
+    return loaded_docs if isinstance(loaded_docs, list) else [loaded_docs]
+
+
 class LocalDocLoader:
     """Loads documents of various formats (PDF) into unified format."""
     @staticmethod
-    def convert_excel_to_csv(
-        excel_path: str, csv_dir: str = "./data/csv"
-    ) -> List[str]:
-        """Convert Excel file to CSV and save in the same directory
-        
-        Args:
-            excel_path: Path to the Excel file
-            
-        Returns:
-            Path to the saved CSV file
-        """
-        try:
-            os.makedirs(csv_dir, exist_ok=True)
-            base_name = os.path.splitext(os.path.basename(excel_path))[0]
+    def _build_pdf_document(
+        file_path: str,
+        page_texts: List[Tuple[int, Optional[str]]],
+        total_pages: int
+    ) -> List[LoadedUnstructuredDocument]:
+        """Build the document from (page number, text) pairs in page order"""
+        metadata = {
+            'source': file_path,
+            'type': 'pdf'
+        }
+        content = []
+        for i, text in page_texts:
+            if text:
+                content.append(text)
+                metadata[f'page_{i}_length'] = str(len(text))
+        metadata['total_pages'] = str(total_pages)
 
-            xls = pd.ExcelFile(excel_path)
-            sheet_names = xls.sheet_names
+        full_text = "\n\n".join(content)
 
-            csv_paths = []
+        if not full_text.strip():
+            raise ValueError("No text could be extracted from "
+                             f"PDF {file_path}")
+        return [LoadedUnstructuredDocument(
+            content=full_text, metadata=metadata)]
 
-            for sheet_name in sheet_names:
-                safe_sheet_name = "".join(
-                    c if c.isalnum() or c in ('-', '_') else '_'
-                    for c in sheet_name.lower()
-                )
-                csv_path = os.path.join(
-                    csv_dir,
-                    f"{base_name}_{safe_sheet_name}.csv"
-                )
-                df = pd.read_excel(excel_path, sheet_name=sheet_name)
-                df.to_csv(csv_path, index=False, encoding='utf-8-sig')
-                
-                logger.info(f"Successfully converted sheet '{sheet_name}' to CSV: "
-                            f"{csv_path}")
-                csv_paths.append(csv_path)
-            return csv_paths
-            
-        except Exception as e:
-            logger.error(f"Error converting Excel to CSV: {str(e)}")
-            raise
-    
     def _load_pdf(self, file_path: str) -> List[LoadedUnstructuredDocument]:
         """Load a PDF document."""
-        metadata = {
-            'source': file_path,
-            'type': 'pdf'
-        }
         try:
-            with open(file_path, 'rb') as file:
-                pdf = pypdf.PdfReader(file)
-                if len(pdf.pages) == 0:
-                    raise ValueError(f"PDF file {file_path} is empty")
-                content = []
-                total_chars = 0
-                
-                for i, page in enumerate(pdf.pages, 1):
-                    try:
-                        text = page.extract_text()
-                        if text:
-                            content.append(text)
-                            chars_in_page = len(text)
-                            total_chars += chars_in_page
-                            metadata[f'page_{i}_length'] = str(chars_in_page)
-                
-                    except Exception as e:
-                        logger.warning("Error reading page {i} of "
-                                       f" PDF {file_path}: {str(e)}")
-                metadata['total_pages'] = str(len(pdf.pages))
-                
-                full_text = "\n\n".join(content)
-                
-                if not full_text.strip():
-                    raise ValueError("No text could be extracted from "
-                                     f"PDF {file_path}")
-                doc = [LoadedUnstructuredDocument(
-                    content=full_text, metadata=metadata)]
-                return doc
+            total_pages = _pdf_page_count(file_path)
+            if total_pages == 0:
+                raise ValueError(f"PDF file {file_path} is empty")
+            return self._build_pdf_document(
+                file_path,
+                _extract_pdf_pages(file_path, 0, total_pages),
+                total_pages
+            )
         except FileNotFoundError:
             raise FileNotFoundError(f"PDF file not found: {file_path}")
         except Exception as e:
@@ -162,19 +162,20 @@ class LocalDocLoader:
         elif file_ext == '.txt':
             return self._load_txt(file_path)
         elif file_ext in ['.xlsx', '.xls']:
-            csv_paths = self.convert_excel_to_csv(
-                file_path, cfg.local_doc.csv_dir
+            # Sheets are read straight into DataFrames, the workbook once
+            sheets = read_workbook(
+                file_path, cfg.local_doc.get('sheet_cache_dir')
             )
-            logger.info(f"Converted Excel file {file_path} to CSV: {csv_paths}")
+            logger.info(f"Read Excel file {file_path} sheets: "
+                        f"{list(sheets)}")
         elif file_ext == '.csv':
-            csv_paths = [file_path]
+            sheets = {None: pd.read_csv(file_path)}
         else:
             raise ValueError(f"Unsupported file format: {file_ext}")
 
         # only executes for Excel and CSV files
         loaded_docs = []
-        for csv_path in csv_paths:
-            df = pd.read_csv(csv_path)
+        for sheet_name, df in sheets.items():
             metadata = {
                 'source': file_path,
                 'type': 'structured',
@@ -186,6 +187,8 @@ class LocalDocLoader:
                     else 'chunked'
                 )
             }
+            if sheet_name is not None:
+                metadata['sheet_name'] = sheet_name
             loaded_docs.append(
                 LoadedStructuredDocument(
                     content=df,
@@ -195,31 +198,132 @@ class LocalDocLoader:
         return loaded_docs
 
 
+class ParallelDocLoader:
+    """Loads files in a process pool, large PDFs split into page ranges.
+
+    submit() schedules a path and returns a function that waits for its
+    documents, so callers collect results in their own (configured) order.
+    """
+
+    def __init__(
+        self,
+        cfg: DictConfig,
+        max_workers: Optional[int] = None,
+        pdf_pages_per_task: int = 20
+    ):
+        self.cfg = cfg
+        self.max_workers = max_workers or min(
+            DEFAULT_MAX_WORKERS, os.cpu_count() or 1
+        )
+        self.pdf_pages_per_task = pdf_pages_per_task
+        # Spawned workers, forking a process that runs threads can deadlock
+        self.pool = ProcessPoolExecutor(
+            self.max_workers,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+
+    def submit(self, path_cfg: DictConfig) -> Callable[[], List]:
+        """Blocks while a PDF is opened to count its pages"""
+        file_path = path_cfg.path
+        if os.path.splitext(file_path)[1].lower() == '.pdf':
+            try:
+                total_pages = _pdf_page_count(file_path)
+            except Exception:
+                # Reported by the whole-file load below
+                total_pages = 0
+            if total_pages > self.pdf_pages_per_task:
+                return self._submit_pdf_pages(file_path, total_pages)
+        future = self.pool.submit(_load_path, self.cfg, path_cfg)
+        return future.result
+
+    def _submit_pdf_pages(self, file_path: str, total_pages: int):
+        futures = [
+            self.pool.submit(
+                _extract_pdf_pages,
+                file_path,
+                start,
+                min(start + self.pdf_pages_per_task, total_pages)
+            )
+            for start in range(0, total_pages, self.pdf_pages_per_task)
+        ]
+
+        def result() -> List[LoadedUnstructuredDocument]:
+            try:
+                page_texts = [
+                    page for future in futures for page in future.result()
+                ]
+                return LocalDocLoader._build_pdf_document(
+                    file_path, page_texts, total_pages
+                )
+            except Exception as e:
+                raise ValueError(f"Error reading PDF {file_path}: {str(e)}")
+        return result
+
+    def close(self) -> None:
+        self.pool.shutdown(cancel_futures=True)
+
+    def __enter__(self) -> 'ParallelDocLoader':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def create_parallel_loader(cfg: DictConfig) -> Optional[ParallelDocLoader]:
+    """Process pool loader as configured, None to load in-process
+
+    Every spawned worker imports the application again, so the default is
+    a few workers rather than one per core.
+    """
+    max_workers = cfg.local_doc.get('max_workers', DEFAULT_MAX_WORKERS)
+    if max_workers is None:
+        max_workers = min(DEFAULT_MAX_WORKERS, os.cpu_count() or 1)
+    if max_workers <= 1:
+        return None
+    return ParallelDocLoader(
+        cfg,
+        max_workers=max_workers,
+        pdf_pages_per_task=cfg.local_doc.get('pdf_pages_per_task', 20)
+    )
+
+
 def load_local_doc(
-    cfg: DictConfig
+    cfg: DictConfig,
+    paths: Optional[List[DictConfig]] = None
 ) -> List[Union[LoadedUnstructuredDocument, LoadedStructuredDocument]]:
     """Load documents from local filesystem based on configuration.
+
+    With local_doc.max_workers above 1, files (and page ranges of large
+    PDFs) are loaded in a process pool. Documents are returned in the
+    order of the paths either way.
     
     Args:
         cfg: Hydra configuration object
+        paths: Subset of cfg.local_doc.paths to load, defaults to all
         
     Returns:
         List of loaded documents
     """
     documents = []
-    paths = cfg.local_doc.paths
-    for path in paths:
-        try:
-            doc_loader = LocalDocLoader()
-            loaded_docs = doc_loader._load_document(cfg, path)
-
-            if isinstance(loaded_docs, list):
-                documents.extend(loaded_docs)
-            else:
-                documents.append(loaded_docs)
-            logger.info(f"Successfully loaded document: {path['path']}")
-        except Exception as e:
-            logger.error(f"Error loading document {path['path']}: {str(e)}")
+    if paths is None:
+        paths = cfg.local_doc.paths
+    parallel_loader = create_parallel_loader(cfg) if len(paths) else None
+    try:
+        if parallel_loader is not None:
+            results = [parallel_loader.submit(path) for path in paths]
+        else:
+            results = [partial(_load_path, cfg, path) for path in paths]
+        for path, result in zip(paths, results):
+            try:
+                documents.extend(result())
+                logger.info(f"Successfully loaded document: {path['path']}")
+            except Exception as e:
+                logger.error(
+                    f"Error loading document {path['path']}: {str(e)}"
+                )
+    finally:
+        if parallel_loader is not None:
+            parallel_loader.close()
     logger.info(f"Total {len(documents)} documents loaded.")
     logger.info(f"Docs after loading: {documents}")
     return documents
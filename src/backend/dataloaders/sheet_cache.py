@@ -0,0 +1,149 @@
+"""Columnar (Parquet) cache of parsed workbook sheets.
+
+Entries are keyed by the SHA-256 of the workbook, so an edited workbook is
+parsed again and an unchanged one is loaded from its cached columns. Only
+the newest entry of each workbook path is kept.
+
+Row chunk ids are hashes of the row text, so a sheet is only cached if it
+reads back with the same values and dtypes as the Excel parse.
+"""
+import json
+import logging
+import os
+import shutil
+import tempfile
+from typing import Dict, Optional
+import numpy as np
+import pandas as pd
+from src.backend.utils.hashing import file_sha256
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = 'sheets.json'
+
+
+def _read_sheet(path: str) -> pd.DataFrame:
+    df = pd.read_parquet(path)
+    # Missing values of object columns come back as None, Excel gives NaN
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].where(df[col].notna(), np.nan)
+    return df
+
+
+def _same_rows(cached: pd.DataFrame, parsed: pd.DataFrame) -> bool:
+    """Whether both frames serialize to the same row text"""
+    return (
+        cached.columns.equals(parsed.columns)
+        and cached.index.equals(parsed.index)
+        and list(cached.dtypes) == list(parsed.dtypes)
+        and cached.map(str).equals(parsed.map(str))
+    )
+
+
+class SheetCache:
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+
+    def _entry_dir(self, workbook_hash: str) -> str:
+        return os.path.join(self.cache_dir, workbook_hash)
+
+    @staticmethod
+    def _read_index(entry_dir: str) -> Dict:
+        with open(
+            os.path.join(entry_dir, INDEX_FILE), 'r', encoding='utf-8'
+        ) as f:
+            return json.load(f)
+
+    def get(self, workbook_hash: str) -> Optional[Dict[str, pd.DataFrame]]:
+        """Cached sheets by name, in workbook order, or None on a miss"""
+        entry_dir = self._entry_dir(workbook_hash)
+        if not os.path.exists(os.path.join(entry_dir, INDEX_FILE)):
+            return None
+        try:
+            return {
+                sheet['name']: _read_sheet(
+                    os.path.join(entry_dir, sheet['file'])
+                )
+                for sheet in self._read_index(entry_dir)['sheets']
+            }
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable sheet cache {entry_dir}: "
+                           f"{str(e)}")
+            return None
+
+    def put(
+        self,
+        workbook_hash: str,
+        sheets: Dict[str, pd.DataFrame],
+        source: Optional[str] = None
+    ) -> None:
+        """Store the sheets, skipped with a warning if they can't be stored
+        as Parquet (e.g. mixed-type or non-string column names) or don't
+        read back the same. Older entries of the same source are removed."""
+        entry_dir = self._entry_dir(workbook_hash)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir)
+        try:
+            index = []
+            for i, (name, df) in enumerate(sheets.items()):
+                file_name = f"{i}.parquet"
+                path = os.path.join(tmp_dir, file_name)
+                df.to_parquet(path)
+                if not _same_rows(_read_sheet(path), df):
+                    raise ValueError(f"sheet '{name}' reads back differently")
+                index.append({'name': name, 'file': file_name})
+            with open(
+                os.path.join(tmp_dir, INDEX_FILE), 'w', encoding='utf-8'
+            ) as f:
+                json.dump({'source': source, 'sheets': index}, f)
+            # Readers never see a partly written entry
+            try:
+                os.replace(tmp_dir, entry_dir)
+            except OSError:
+                if not os.path.exists(entry_dir):
+                    raise
+                # Written by a concurrent or earlier run, same content
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        except Exception as e:
+            logger.warning(f"Not caching sheets of workbook "
+                           f"{workbook_hash}: {str(e)}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        if source:
+            self._prune(source, keep=workbook_hash)
+
+    def _prune(self, source: str, keep: str) -> None:
+        """Remove the entries of earlier versions of a workbook"""
+        for name in os.listdir(self.cache_dir):
+            entry_dir = self._entry_dir(name)
+            if name == keep or not os.path.isdir(entry_dir):
+                continue
+            try:
+                if self._read_index(entry_dir).get('source') != source:
+                    continue
+            except Exception:
+                # Not an entry, e.g. another run's temp dir
+                continue
+            logger.info(f"Removing outdated sheet cache {entry_dir}")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+
+
+def read_workbook(
+    excel_path: str, cache_dir: Optional[str] = None
+) -> Dict[str, pd.DataFrame]:
+    """All sheets of a workbook by name, parsed once
+
+    With a cache_dir, sheets are loaded from the Parquet cache when the
+    workbook is unchanged, and cached after parsing otherwise.
+    """
+    if not cache_dir:
+        return pd.read_excel(excel_path, sheet_name=None)
+    cache = SheetCache(cache_dir)
+    workbook_hash = file_sha256(excel_path)
+    sheets = cache.get(workbook_hash)
+    if sheets is not None:
+        logger.info(f"Loaded sheets of {excel_path} from cache")
+        return sheets
+    sheets = pd.read_excel(excel_path, sheet_name=None)
+    cache.put(workbook_hash, sheets, source=os.path.abspath(excel_path))
+    return sheets
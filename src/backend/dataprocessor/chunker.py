@@ -1,5 +1,9 @@
 import logging
-from typing import List, Dict, Union
+from collections import ChainMap
+from collections.abc import Sequence
+from types import MappingProxyType
+from typing import Iterator, List, Dict, Mapping, Union
+import numpy as np
 import pandas as pd
 import tiktoken
 from omegaconf import DictConfig
@@ -13,6 +17,115 @@ from src.backend.dataprocessor.chunker_factory import ChunkingStrategyFactory
 logger = logging.getLogger(__name__)
 
 
+def _column_text(values: pd.Series) -> pd.Series:
+    """str() of every value of a column, vectorized where possible"""
+    if isinstance(values.dtype, np.dtype) and (
+        pd.api.types.is_numeric_dtype(values)
+        or pd.api.types.is_bool_dtype(values)
+    ):
+        # Missing values can stay missing with a string dtype
+        return values.astype(str).fillna('nan')
+    if (
+        pd.api.types.is_datetime64_dtype(values)
+        and not values.dt.microsecond.fillna(0).any()
+        and not values.dt.nanosecond.fillna(0).any()
+    ):
+        # The str(Timestamp) format for whole seconds
+        return values.dt.strftime('%Y-%m-%d %H:%M:%S').fillna('NaT')
+    # Text, mixed, categorical and sub-second or timezone-aware datetime
+    # columns, as the Python values iterrows gives
+    return values.astype(object).map(str)
+
+
+def _row_values(values: pd.Series, row_dtype: np.dtype) -> pd.Series:
+    """A column as the values iterrows rows give for it"""
+    if row_dtype != object and values.dtype != row_dtype:
+        values = values.astype(row_dtype)
+    if (
+        isinstance(values.dtype, np.dtype)
+        and pd.api.types.is_float_dtype(values)
+        and values.dtype != np.float64
+    ):
+        # Row values are Python floats, e.g. float32 0.1 is
+        # 0.10000000149011612, the value of its float64 cast
+        values = values.astype(np.float64)
+    return values
+
+
+def _column_wise(dtype) -> bool:
+    """Whether iterrows values of a column don't depend on the others"""
+    return isinstance(dtype, (
+        np.dtype, pd.CategoricalDtype, pd.DatetimeTZDtype, pd.StringDtype
+    ))
+
+
+def serialize_rows(doc: pd.DataFrame) -> List[str]:
+    """'col: val' text of every row, built column-wise
+
+    Same text as str() of the values of doc.iterrows(), whose rows have
+    the common dtype of all columns, e.g. ints of an all-numeric frame
+    with float columns read as floats ('1.0'), and Python values in
+    frames with text columns.
+    """
+    if not all(_column_wise(dtype) for dtype in doc.dtypes):
+        # Missing values of nullable columns come out as nan or NA
+        # depending on the whole row, so these rows take the slow path
+        return [
+            " ".join(f"{col}: {str(val)}" for col, val in row.items())
+            for _, row in doc.iterrows()
+        ]
+    # The dtype iterrows rows get, without interleaving any data
+    row_dtype = doc.iloc[:0].values.dtype
+    texts = None
+    for i, col in enumerate(doc.columns):
+        values = _row_values(doc.iloc[:, i], row_dtype)
+        column = f"{col}: " + _column_text(values)
+        # Appended one column at a time to keep only two columns in memory
+        texts = column if texts is None else texts.str.cat(column, sep=' ')
+    if texts is None:
+        return [''] * len(doc)
+    return texts.tolist()
+
+
+class StructuredRowChunks(Sequence):
+    """Row chunks of a DataFrame, one per row, created on access.
+
+    Rows share one read-only base metadata mapping, each chunk's metadata
+    only adds its chunk_index on top of it.
+    """
+
+    def __init__(self, texts: List[str], index: List, base_metadata: Dict):
+        self.texts = texts
+        self.index = index
+        self.base_metadata: Mapping = MappingProxyType(base_metadata)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def _chunk(self, position: int) -> Dict:
+        return {
+            'content': self.texts[position],
+            'metadata': ChainMap(
+                {'chunk_index': self.index[position]}, self.base_metadata
+            )
+        }
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [
+                self._chunk(i) for i in range(*position.indices(len(self)))
+            ]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return self._chunk(position)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for position in range(len(self)):
+            yield self._chunk(position)
+
+
 class Chunker:
     def __init__(
         self,
@@ -69,23 +182,17 @@ class Chunker:
                 'metadata': metadata
             }
 
-        chunks = []
-        for index, row in doc.iterrows():
-            row_text = " ".join([
-                f"{col}: {str(val)}"
-                for col, val in row.items()
-            ])
-            chunk_metadata = {
+        # Row texts are built column-wise, chunk dicts only when iterated
+        chunks = StructuredRowChunks(
+            serialize_rows(doc),
+            doc.index.tolist(),
+            {
                 **metadata,
                 'is_structured': True,
                 'chunk_type': 'row',
-                'chunk_index': index,
                 'total_chunks': total_rows
             }
-            chunks.append({
-                'content': row_text,
-                'metadata': chunk_metadata
-            })
+        )
         logger.info(f"Structured data: {len(chunks)} chunks")
         return {
             'type': 'chunked',
@@ -169,20 +276,8 @@ class Chunker:
             return self._chunk_unstructured_doc(doc, model, metadata)
 
 
-def batch_chunk_doc(
-    cfg: DictConfig,
-    documents: List[Union[LoadedUnstructuredDocument, LoadedStructuredDocument]]
-) -> List[Dict]:
-    """Entry point for chunking documents.
-    Args:
-        cfg (DictConfig): Configuration object.
-        documents (List[Union[LoadedUnstructuredDocument,
-            LoadedStructuredDocument]]):
-            List of documents to chunk.
-            
-    Returns:
-        List[Dict]: List of chunked documents.
-    """
+def create_chunker(cfg: DictConfig) -> Chunker:
+    """Chunker configured from cfg.chunker"""
     chunking_config = {
         'strategy': cfg.chunker.get('strategy', 'recursive'),
         'chunk_size': cfg.chunker.recursive.chunk_size,
@@ -199,11 +294,28 @@ def batch_chunk_doc(
         ),
         'min_chunk_size': cfg.chunker.semantic.get('min_chunk_size', None),
     }
-    chunker = Chunker(
+    return Chunker(
         token_threshold=cfg.chunker.token_threshold,
         chunking_config=chunking_config
     )
 
+
+def batch_chunk_doc(
+    cfg: DictConfig,
+    documents: List[Union[LoadedUnstructuredDocument, LoadedStructuredDocument]]
+) -> List[Dict]:
+    """Entry point for chunking documents.
+    Args:
+        cfg (DictConfig): Configuration object.
+        documents (List[Union[LoadedUnstructuredDocument,
+            LoadedStructuredDocument]]):
+            List of documents to chunk.
+            
+    Returns:
+        List[Dict]: List of chunked documents.
+    """
+    chunker = create_chunker(cfg)
+
     chunked_doc = []
     detailed_chunk_info = []
     for i, doc in enumerate(documents):
@@ -1,46 +1,76 @@
+import asyncio
 import logging
-from typing import List, Dict, Optional
-import uuid
+import random
+import time
+from collections import defaultdict
+from typing import Iterable, List, Dict, Optional, Set, Tuple
 import os
 import json
 from omegaconf import DictConfig
 from pydantic_ai import Agent
 import chromadb
+import httpx
+import openai
 from chromadb.config import Settings
 import chromadb.utils.embedding_functions as embedding_functions
 from utils.settings import SETTINGS
 from src.backend.models.embedding_metadata import EmbeddingMetadata
+from src.backend.chat.keyword_index import KeywordIndex
+from src.backend.dataprocessor.ingest_manifest import IngestManifest
+from src.backend.utils.hashing import content_id
+from src.backend.utils.local_embedding import create_embedding_function
+from src.backend.utils.llm_model_factory import LLMModelFactory
 
 logger = logging.getLogger(__name__)
 
 
 class Embedder:
-    def __init__(self, cfg, persist_directory: str):
+    def __init__(
+        self,
+        cfg,
+        persist_directory: str,
+        keyword_index: Optional[KeywordIndex] = None
+    ):
         os.makedirs(persist_directory, exist_ok=True)
         self.client = chromadb.PersistentClient(
             path=persist_directory,
             settings=Settings(anonymized_telemetry=False)
         )
         self.collection = None
+        # Kept in step with the collection when running in-process with
+        # the retriever, so new chunks are keyword-searchable immediately
+        self.keyword_index = keyword_index
         self.prompts = cfg.extract_metadata
         self.agent = Agent(
-            'openai:gpt-4o-mini',
+            LLMModelFactory.create_model(
+                {'provider': 'openai', 'model_name': 'gpt-4o-mini'}
+            ),
             result_type=EmbeddingMetadata,
             system_prompt=self.prompts['system_prompt']
         )
+        embedder_cfg = cfg.get('embedder', {})
+        # Bounds concurrent metadata extraction calls to the LLM provider
+        self._semaphore = asyncio.Semaphore(
+            embedder_cfg.get('metadata_concurrency', 8)
+        )
+        self.max_retries = embedder_cfg.get('metadata_max_retries', 5)
+        self.retry_base_delay = embedder_cfg.get(
+            'metadata_retry_base_delay', 1.0
+        )
+        self.add_batch_size = embedder_cfg.get('add_batch_size', 256)
+        # Off for offline ingestion, chunks are stored without LLM metadata
+        self.extract_metadata = embedder_cfg.get('extract_metadata', True)
 
     def _create_embedding_function(
         self,
         provider: str,
         model_name: str,
-        api_key: Optional[str] = None
+        api_key: Optional[str] = None,
+        local_cfg: Optional[Dict] = None
     ) -> embedding_functions.EmbeddingFunction:
-        if provider.lower() == "openai":
-            return embedding_functions.OpenAIEmbeddingFunction(
-                api_key=api_key,
-                model_name=model_name
-            )
-        raise ValueError(f"Unsupported embedding provider: {provider}")
+        return create_embedding_function(
+            provider, model_name, api_key=api_key, local_cfg=local_cfg
+        )
 
     def _create_collection(
         self,
@@ -58,14 +88,67 @@ class Embedder:
             embedding_function=embedding_function
         )
     
-    async def _extract_metadata(self, content: str) -> EmbeddingMetadata:
-        logger.info("Start Extracting metadata")
-        result = await self.agent.run(
-            self.prompts['user_prompt'].format(content=content)
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        """Rate limits, server errors, timeouts and connection errors are
+        worth retrying, other errors (4xx, invalid output) fail fast"""
+        # pydantic-ai wraps the provider's error as the cause of its own
+        while error is not None:
+            status = getattr(error, 'status_code', None) or getattr(
+                getattr(error, 'response', None), 'status_code', None
+            )
+            if isinstance(status, int):
+                return status in (408, 429) or status >= 500
+            if isinstance(error, (
+                openai.APIConnectionError,
+                httpx.TransportError,
+                TimeoutError,
+                ConnectionError
+            )):
+                return True
+            error = error.__cause__
+        return False
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """Exponential backoff with jitter, honouring Retry-After on 429s"""
+        delay = self.retry_base_delay * 2 ** attempt
+        # pydantic-ai wraps the provider's APIStatusError, which has the
+        # HTTP response, as the cause of its own exception
+        response = (
+            getattr(error, 'response', None)
+            or getattr(error.__cause__, 'response', None)
         )
-        metadata = result.data
-        logger.info(f"Extracted metadata: {metadata}")
-        return metadata
+        headers = getattr(response, 'headers', None) or {}
+        retry_after = headers.get('retry-after')
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return delay + random.uniform(0, self.retry_base_delay)
+
+    async def _extract_metadata(self, content: str) -> EmbeddingMetadata:
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    result = await self.agent.run(
+                        self.prompts['user_prompt'].format(content=content)
+                    )
+                    metadata = result.data
+                    logger.debug(f"Extracted metadata: {metadata}")
+                    return metadata
+                except Exception as e:
+                    if attempt == self.max_retries or (
+                        not self._is_retryable(e)
+                    ):
+                        raise
+                    # Sleep while holding the slot, so a rate-limited
+                    # provider also slows down the other workers
+                    delay = self._retry_delay(e, attempt)
+                    logger.warning(f"Metadata extraction failed ({e}), "
+                                   f"retry {attempt + 1}/{self.max_retries} "
+                                   f"in {delay:.1f}s")
+                    await asyncio.sleep(delay)
 
     def _convert_metadata_str(self, metadata: Dict) -> Dict:
         return {
@@ -77,53 +160,221 @@ class Embedder:
             for key, value in metadata.items()
         }
 
-    async def _store_processed_documents(self, processed_docs: List[Dict]):
+    async def _enrich_chunk(
+        self, chunk_id: str, chunk: Dict, total_chunks: int, doc_id: str
+    ) -> Tuple[str, str, Dict]:
+        """Extract metadata for a chunk, returns (id, content, metadata)"""
+        extracted = {}
+        if self.extract_metadata:
+            extracted_metadata = await self._extract_metadata(chunk['content'])
+            extracted = extracted_metadata.model_dump()
+        enhanced_metadata = {
+            **chunk['metadata'],
+            **extracted,
+            'chunk_type': 'partial',
+            'total_chunks': total_chunks,
+            'doc_id': doc_id
+        }
+        metadata = self._convert_metadata_str(enhanced_metadata)
+        return chunk_id, chunk['content'], metadata
+
+    def _write_batch(
+        self, ids: List[str], documents: List[str], metadatas: List[Dict]
+    ) -> None:
+        """Write a batch of chunks to the collection (and keyword index)"""
+        if not ids:
+            return
+        # Ids are content hashes, so re-ingesting a chunk overwrites it
+        self.collection.upsert(
+            documents=documents,
+            metadatas=metadatas,
+            ids=ids
+        )
+        if self.keyword_index is not None:
+            self.keyword_index.add(ids, documents, metadatas)
+        logger.info(f"Stored batch of {len(ids)} chunks")
+
+    def _full_collection(self):
+        return self.client.get_or_create_collection(
+            name=f"{self.collection.name}_full",
+            metadata={"type": "full_documents"}
+        )
+
+    def _store_full_document(self, doc: Dict) -> str:
+        """For full documents, store without embeddings, returns the id"""
+        content = doc['content']
+        if not isinstance(content, str):
+            # Small structured documents are kept as a list of records
+            content = json.dumps(content, ensure_ascii=False, default=str)
+        source = doc.get('metadata', {}).get('source', '')
+        full_id = content_id(source, content)
+        self._full_collection().upsert(
+            documents=[content],
+            metadatas=[{'source': source}],
+            ids=[full_id]
+        )
+        return full_id
+
+    def _existing_ids(self, ids: List[str], batch_size: int = 1000) -> Set[str]:
+        """Ids among `ids` that are already stored in the collection"""
+        existing = set()
+        for i in range(0, len(ids), batch_size):
+            existing.update(
+                self.collection.get(
+                    ids=ids[i:i + batch_size], include=[]
+                )['ids']
+            )
+        return existing
+
+    def _delete_stale(
+        self, collection, source: str, current_ids: Set[str]
+    ) -> List[str]:
+        """Delete a source's stored entries that it no longer produces"""
+        stored = collection.get(where={'source': source}, include=[])['ids']
+        stale = [doc_id for doc_id in stored if doc_id not in current_ids]
+        if stale:
+            collection.delete(ids=stale)
+            if (
+                self.keyword_index is not None
+                and collection.name == self.collection.name
+            ):
+                self.keyword_index.remove(stale)
+            logger.info(f"Deleted {len(stale)} stale entries of {source} "
+                        f"from {collection.name}")
+        return stale
+
+    def delete_sources(self, sources: Iterable[str]) -> None:
+        """Delete everything ingested from sources that no longer exist"""
+        for source in sources:
+            self._delete_stale(self.collection, source, set())
+            self._delete_stale(self._full_collection(), source, set())
+
+    async def _store_processed_documents(
+        self,
+        processed_docs: List[Dict],
+        manifest: Optional[IngestManifest] = None
+    ):
         """
         Store processed documents in ChromaDB.
         Handles both chunked and full documents appropriately.
+
+        Chunk ids are hashes of source and content, so chunks that are
+        already stored are skipped, and stored chunks a source no longer
+        produces are deleted. Metadata is extracted for the new chunks
+        concurrently, bounded by the semaphore, and chunks are written in
+        large batches as results arrive. Sources whose chunks were all
+        stored are recorded in the manifest.
         """
+        # chunk id -> (chunk, total chunks, doc id), deduped by content
+        pending: Dict[str, Tuple[Dict, int, str]] = {}
+        chunk_ids_by_source: Dict[str, Set[str]] = defaultdict(set)
+        full_ids_by_source: Dict[str, Set[str]] = defaultdict(set)
         for doc in processed_docs:
             if doc['type'] == 'chunked':
-                chunk_metadatas = []
-                # For chunked documents, store each chunk with its embedding
-                # Use add method, upsert might overwrite existing embeddings
                 for chunk in doc['chunks']:
-                    extracted_metadata = await self._extract_metadata(
-                        chunk['content']
-                    )
-                    enhanced_metadata = {
-                        **chunk['metadata'],
-                        **extracted_metadata.model_dump(),
-                        'chunk_type': 'partial',
-                        'total_chunks': doc['num_chunks'],
-                        'doc_id': doc.get('doc_id', str(uuid.uuid4()))
-                    }
-                    metadata = self._convert_metadata_str(enhanced_metadata)
-                    chunk_metadatas.append(metadata)
-                    logger.info(f"Storing chunk with metadata: {metadata}")
-                self.collection.add(
-                    documents=[chunk['content'] for chunk in doc['chunks']],
-                    metadatas=chunk_metadatas,
-                    ids=[str(uuid.uuid4()) for _ in doc['chunks']]
-                )
+                    source = chunk['metadata'].get('source', '')
+                    chunk_id = content_id(source, chunk['content'])
+                    chunk_ids_by_source[source].add(chunk_id)
+                    pending.setdefault(chunk_id, (
+                        chunk,
+                        doc['num_chunks'],
+                        doc.get('doc_id') or content_id(source)
+                    ))
             else:
-                # For full documents, store without embeddings
-                self.client.get_or_create_collection(
-                    name=f"{self.collection.name}_full",
-                    metadata={"type": "full_documents"}
-                ).add(
-                    documents=[doc['content']],
-                    ids=[str(uuid.uuid4())]
-                )
+                source = doc.get('metadata', {}).get('source', '')
+                full_ids_by_source[source].add(self._store_full_document(doc))
 
+        existing = self._existing_ids(list(pending))
+        new_ids = [chunk_id for chunk_id in pending if chunk_id not in existing]
+        logger.info(f"{len(pending)} chunks, {len(existing)} unchanged, "
+                    f"{len(new_ids)} new or changed")
+        tasks = [
+            asyncio.create_task(
+                self._enrich_chunk(chunk_id, *pending[chunk_id])
+            )
+            for chunk_id in new_ids
+        ]
 
-async def embed_doc(cfg: DictConfig, chunked_docs: List[Dict]) -> None:
-    logger.info("Starting document embedding process...")
+        ids, documents, metadatas = [], [], []
+        stored = set(existing)
+        total = len(tasks)
+        done = failed = 0
+        start = time.perf_counter()
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    chunk_id, content, metadata = await next_done
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"Skipping chunk, metadata extraction "
+                                 f"failed: {e}")
+                    continue
+                finally:
+                    done += 1
+                ids.append(chunk_id)
+                documents.append(content)
+                metadatas.append(metadata)
+                if len(ids) >= self.add_batch_size:
+                    # Embeds and upserts off the loop, extraction goes on
+                    await asyncio.to_thread(
+                        self._write_batch, ids, documents, metadatas
+                    )
+                    stored.update(ids)
+                    ids, documents, metadatas = [], [], []
+                if done % 50 == 0 or done == total:
+                    elapsed = time.perf_counter() - start
+                    logger.info(f"Metadata extracted for {done}/{total} "
+                                f"chunks ({done / elapsed:.1f} chunks/s)")
+            await asyncio.to_thread(
+                self._write_batch, ids, documents, metadatas
+            )
+            stored.update(ids)
+        finally:
+            for task in tasks:
+                task.cancel()
+        if failed:
+            logger.warning(f"{failed}/{total} chunks were not stored")
+        self._finalize_sources(
+            chunk_ids_by_source, full_ids_by_source, stored, manifest
+        )
+
+    def _finalize_sources(
+        self,
+        chunk_ids_by_source: Dict[str, Set[str]],
+        full_ids_by_source: Dict[str, Set[str]],
+        stored: Set[str],
+        manifest: Optional[IngestManifest] = None
+    ) -> None:
+        """Delete stale entries of the sources whose chunks were all stored
+        and record them in the manifest
+
+        Partly stored sources keep their previous entries and are not
+        recorded, so they are retried on the next run.
+        """
+        for source in chunk_ids_by_source.keys() | full_ids_by_source.keys():
+            chunk_ids = chunk_ids_by_source.get(source, set())
+            if not chunk_ids <= stored:
+                logger.warning(f"{source} was only partially stored, "
+                               f"keeping its previous entries")
+                continue
+            self._delete_stale(self.collection, source, chunk_ids)
+            self._delete_stale(
+                self._full_collection(),
+                source,
+                full_ids_by_source.get(source, set())
+            )
+            if manifest is not None and source:
+                manifest.record(source, len(chunk_ids))
+
+
+def build_embedder(cfg: DictConfig) -> Embedder:
+    """Embedder with the configured collection created or opened"""
     embedder = Embedder(cfg, cfg.embedder.persist_dir)
     embedding_fn = embedder._create_embedding_function(
-        provider=cfg.llm.provider,
+        provider=cfg.llm.get('embedding_provider', 'openai'),
         model_name=cfg.llm.embedding_model,
-        api_key=SETTINGS.OPENAI_API_KEY
+        api_key=SETTINGS.OPENAI_API_KEY,
+        local_cfg=cfg.get('local_embedding')
     )
     embedder.collection = embedder._create_collection(
         collection_name=cfg.embedder.collection,
@@ -131,6 +382,17 @@ async def embed_doc(cfg: DictConfig, chunked_docs: List[Dict]) -> None:
         embedding_function=embedding_fn
     )
     logger.info(f"Created Collection: {embedder.collection.name}")
+    return embedder
+
+
+async def embed_doc(
+    cfg: DictConfig,
+    chunked_docs: List[Dict],
+    manifest: Optional[IngestManifest] = None,
+    removed_sources: Iterable[str] = ()
+) -> None:
+    logger.info("Starting document embedding process...")
+    embedder = build_embedder(cfg)
 
     total_chunks = sum(
         len(doc['chunks']) if doc['type'] == 'chunked' else 1
@@ -139,7 +401,13 @@ async def embed_doc(cfg: DictConfig, chunked_docs: List[Dict]) -> None:
     logger.info(f"Processing {len(chunked_docs)} documents "
                 f"with total {total_chunks} chunks")
     try:
-        await embedder._store_processed_documents(chunked_docs)
+        removed_sources = list(removed_sources)
+        if removed_sources:
+            embedder.delete_sources(removed_sources)
+            if manifest is not None:
+                for source in removed_sources:
+                    manifest.forget(source)
+        await embedder._store_processed_documents(chunked_docs, manifest)
         
         # Verify embeddings by checking collection count
         collection_count = embedder.collection.count()
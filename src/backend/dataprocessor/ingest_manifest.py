@@ -0,0 +1,72 @@
+"""Manifest of ingested source files, for incremental re-ingestion.
+
+For every ingested source path it records a fingerprint (size, mtime,
+SHA-256), so unchanged files are skipped on the next run.
+"""
+import json
+import logging
+import os
+from typing import Dict, Optional
+from src.backend.utils.hashing import file_sha256
+
+logger = logging.getLogger(__name__)
+
+
+class IngestManifest:
+    def __init__(self, path: str):
+        self.path = path
+        self.files: Dict[str, Dict] = {}
+        self._fingerprints: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                self.files = json.load(file).get('files', {})
+            logger.info(f"Loaded ingest manifest with {len(self.files)} files")
+
+    @staticmethod
+    def fingerprint(path: str, sha256: Optional[str] = None) -> Dict:
+        stat = os.stat(path)
+        return {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'sha256': sha256 or file_sha256(path),
+        }
+
+    def needs_ingest(self, path: str) -> bool:
+        """Whether a file is new or changed since it was last ingested.
+
+        Size and mtime are compared first, the file is only hashed if they
+        differ (e.g. after a touch or a copy).
+        """
+        entry = self.files.get(path)
+        stat = os.stat(path)
+        if (
+            entry
+            and entry['size'] == stat.st_size
+            and entry['mtime'] == stat.st_mtime
+        ):
+            return False
+        fingerprint = self.fingerprint(path)
+        self._fingerprints[path] = fingerprint
+        if entry and entry['sha256'] == fingerprint['sha256']:
+            entry['mtime'] = fingerprint['mtime']
+            return False
+        return True
+
+    def record(self, source: str, num_chunks: int) -> None:
+        """Record a successfully ingested file"""
+        fingerprint = (
+            self._fingerprints.pop(source, None)
+            or self.fingerprint(source)
+        )
+        self.files[source] = {**fingerprint, 'chunks': num_chunks}
+
+    def forget(self, source: str) -> None:
+        self.files.pop(source, None)
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'files': self.files}, file, indent=2)
+        os.replace(tmp_path, self.path)
+        logger.info(f"Saved ingest manifest to {self.path}")
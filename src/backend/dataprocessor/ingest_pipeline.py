@@ -0,0 +1,274 @@
+"""Streaming ingestion from local files to Chroma.
+
+Loading, chunking, metadata extraction and embedding run as concurrent
+stages connected by bounded queues, so embedding starts with the first
+document and memory is bounded by the queue sizes rather than the corpus.
+Blocking work (file parsing, chunking, Chroma reads and writes) runs in
+worker threads. Like Embedder._store_processed_documents, chunks already
+stored are skipped and stale entries of the ingested sources are deleted
+at the end.
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict, deque
+from functools import partial
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from omegaconf import DictConfig
+from src.backend.dataloaders.local_doc_loader import (
+    _load_path,
+    create_parallel_loader
+)
+from src.backend.dataprocessor.chunker import create_chunker
+from src.backend.dataprocessor.embedder import Embedder, build_embedder
+from src.backend.dataprocessor.ingest_manifest import IngestManifest
+from src.backend.utils.hashing import content_id
+
+logger = logging.getLogger(__name__)
+
+# End of stream marker passed between stages
+_DONE = object()
+
+STAGES = ('load', 'chunk', 'unchanged', 'metadata', 'failed', 'write')
+
+
+class IngestPipeline:
+    def __init__(
+        self,
+        cfg: DictConfig,
+        embedder: Embedder,
+        manifest: Optional[IngestManifest] = None
+    ):
+        self.cfg = cfg
+        self.embedder = embedder
+        self.manifest = manifest
+        pipeline_cfg = cfg.get('ingest_pipeline', {})
+        self.doc_queue_size = pipeline_cfg.get('doc_queue_size', 2)
+        self.chunk_queue_size = pipeline_cfg.get('chunk_queue_size', 512)
+        self.lookup_batch_size = pipeline_cfg.get('lookup_batch_size', 256)
+        self.log_interval = pipeline_cfg.get('log_interval_seconds', 10)
+        # One worker per concurrent metadata extraction call
+        self.workers = cfg.embedder.get('metadata_concurrency', 8)
+        self.chunker = create_chunker(cfg)
+        self.chunk_ids_by_source: Dict[str, Set[str]] = defaultdict(set)
+        self.full_ids_by_source: Dict[str, Set[str]] = defaultdict(set)
+        self.stored: Set[str] = set()
+        # Chunk ids already queued, chunks are deduped by content
+        self._seen: Set[str] = set()
+        # Sources that failed part-way, their ids are incomplete
+        self.failed_sources: Set[str] = set()
+        self.counts: Dict[str, int] = dict.fromkeys(STAGES, 0)
+        self._queues: Dict[str, asyncio.Queue] = {}
+
+    async def run(self, paths: List[DictConfig]) -> None:
+        """Ingest the given cfg.local_doc.paths entries"""
+        docs = asyncio.Queue(self.doc_queue_size)
+        chunks = asyncio.Queue(self.chunk_queue_size)
+        results = asyncio.Queue(self.embedder.add_batch_size * 2)
+        self._queues = {'docs': docs, 'chunks': chunks, 'results': results}
+        start = time.perf_counter()
+        reporter = asyncio.create_task(self._report(start))
+        try:
+            async with asyncio.TaskGroup() as group:
+                group.create_task(self._load(paths, docs))
+                group.create_task(self._chunk(docs, chunks))
+                for _ in range(self.workers):
+                    group.create_task(self._enrich(chunks, results))
+                group.create_task(self._write(results))
+        finally:
+            reporter.cancel()
+        self._log_counts(time.perf_counter() - start)
+        if self.failed_sources:
+            logger.warning(f"Not finalized, failed part-way: "
+                           f"{sorted(self.failed_sources)}")
+
+        def complete(ids_by_source: Dict[str, Set[str]]):
+            return {
+                source: ids for source, ids in ids_by_source.items()
+                if source not in self.failed_sources
+            }
+
+        await asyncio.to_thread(
+            self.embedder._finalize_sources,
+            complete(self.chunk_ids_by_source),
+            complete(self.full_ids_by_source),
+            self.stored,
+            self.manifest
+        )
+
+    async def _load(self, paths: List[DictConfig], docs: asyncio.Queue):
+        """Load files in order, with a process pool as many at once as it
+        has workers"""
+        parallel_loader = create_parallel_loader(self.cfg)
+        in_flight = parallel_loader.max_workers if parallel_loader else 1
+        pending = deque()
+        try:
+            for path_cfg in paths:
+                if parallel_loader is not None:
+                    # Opens PDFs to count their pages, off the event loop
+                    result = await asyncio.to_thread(
+                        parallel_loader.submit, path_cfg
+                    )
+                else:
+                    result = partial(_load_path, self.cfg, path_cfg)
+                pending.append((path_cfg, result))
+                if len(pending) >= in_flight:
+                    await self._put_loaded(*pending.popleft(), docs)
+            while pending:
+                await self._put_loaded(*pending.popleft(), docs)
+        finally:
+            if parallel_loader is not None:
+                parallel_loader.close()
+        await docs.put(_DONE)
+
+    async def _put_loaded(
+        self, path_cfg: DictConfig, result, docs: asyncio.Queue
+    ) -> None:
+        try:
+            loaded = await asyncio.to_thread(result)
+        except Exception as e:
+            # Not recorded in the manifest, so retried on the next run
+            logger.error(f"Error loading document {path_cfg.path}: {e}")
+            return
+        logger.info(f"Successfully loaded document: {path_cfg.path}")
+        for doc in loaded:
+            self.counts['load'] += 1
+            await docs.put(doc)
+
+    async def _chunk(self, docs: asyncio.Queue, chunks: asyncio.Queue):
+        lookup: List[Tuple[str, Dict, int, str]] = []
+        while (doc := await docs.get()) is not _DONE:
+            source = doc.metadata.get('source', '')
+            try:
+                result = await asyncio.to_thread(
+                    self.chunker._chunk_single_doc,
+                    doc.content,
+                    self.cfg.llm.model,
+                    doc.metadata
+                )
+                if result['type'] != 'chunked':
+                    full_id = await asyncio.to_thread(
+                        self.embedder._store_full_document, result
+                    )
+                    self.full_ids_by_source[source].add(full_id)
+                    self.counts['chunk'] += 1
+                    continue
+                doc_id = result.get('doc_id') or content_id(source)
+                for chunk in result['chunks']:
+                    chunk_source = chunk['metadata'].get('source', '')
+                    chunk_id = content_id(chunk_source, chunk['content'])
+                    self.chunk_ids_by_source[chunk_source].add(chunk_id)
+                    self.counts['chunk'] += 1
+                    if chunk_id in self._seen:
+                        continue
+                    self._seen.add(chunk_id)
+                    lookup.append(
+                        (chunk_id, chunk, result['num_chunks'], doc_id)
+                    )
+                    if len(lookup) >= self.lookup_batch_size:
+                        await self._forward_new(lookup, chunks)
+                        lookup = []
+            except Exception as e:
+                self.failed_sources.add(source)
+                logger.error(f"Error chunking document {source}: {e}")
+            finally:
+                # The document is not referenced past this point
+                del doc
+        await self._forward_new(lookup, chunks)
+        for _ in range(self.workers):
+            await chunks.put(_DONE)
+
+    async def _forward_new(
+        self,
+        lookup: List[Tuple[str, Dict, int, str]],
+        chunks: asyncio.Queue
+    ) -> None:
+        """Queue the chunks that are not stored yet"""
+        if not lookup:
+            return
+        existing = await asyncio.to_thread(
+            self.embedder._existing_ids, [item[0] for item in lookup]
+        )
+        self.stored.update(existing)
+        self.counts['unchanged'] += len(existing)
+        for item in lookup:
+            if item[0] not in existing:
+                await chunks.put(item)
+
+    async def _enrich(self, chunks: asyncio.Queue, results: asyncio.Queue):
+        while (item := await chunks.get()) is not _DONE:
+            try:
+                result = await self.embedder._enrich_chunk(*item)
+            except Exception as e:
+                self.counts['failed'] += 1
+                logger.error(f"Skipping chunk, metadata extraction "
+                             f"failed: {e}")
+                continue
+            self.counts['metadata'] += 1
+            await results.put(result)
+        await results.put(_DONE)
+
+    async def _write(self, results: asyncio.Queue):
+        remaining = self.workers
+        ids, documents, metadatas = [], [], []
+        while remaining:
+            item = await results.get()
+            if item is _DONE:
+                remaining -= 1
+                continue
+            chunk_id, content, metadata = item
+            ids.append(chunk_id)
+            documents.append(content)
+            metadatas.append(metadata)
+            if len(ids) >= self.embedder.add_batch_size:
+                await self._write_batch(ids, documents, metadatas)
+                ids, documents, metadatas = [], [], []
+        await self._write_batch(ids, documents, metadatas)
+
+    async def _write_batch(
+        self, ids: List[str], documents: List[str], metadatas: List[Dict]
+    ) -> None:
+        # Embeds the batch and upserts it, while the other stages go on
+        await asyncio.to_thread(
+            self.embedder._write_batch, ids, documents, metadatas
+        )
+        self.stored.update(ids)
+        self.counts['write'] += len(ids)
+
+    def _log_counts(self, elapsed: float) -> None:
+        rates = ', '.join(
+            f"{stage} {count} ({count / elapsed:.1f}/s)"
+            for stage, count in self.counts.items()
+        ) if elapsed else ''
+        queued = ', '.join(
+            f"{name} {queue.qsize()}" for name, queue in self._queues.items()
+        )
+        logger.info(f"Ingestion after {elapsed:.0f}s: {rates}; "
+                    f"queued: {queued}")
+
+    async def _report(self, start: float) -> None:
+        while True:
+            await asyncio.sleep(self.log_interval)
+            self._log_counts(time.perf_counter() - start)
+
+
+async def ingest_streaming(
+    cfg: DictConfig,
+    paths: List[DictConfig],
+    manifest: Optional[IngestManifest] = None,
+    removed_sources: Iterable[str] = ()
+) -> None:
+    """Streaming counterpart of load_local_doc, batch_chunk_doc and
+    embed_doc"""
+    logger.info("Starting streaming ingestion...")
+    embedder = build_embedder(cfg)
+    removed_sources = list(removed_sources)
+    if removed_sources:
+        embedder.delete_sources(removed_sources)
+        if manifest is not None:
+            for source in removed_sources:
+                manifest.forget(source)
+    if paths:
+        await IngestPipeline(cfg, embedder, manifest).run(paths)
+    logger.info(f"Collection {embedder.collection.name} has "
+                f"{embedder.collection.count()} chunks")
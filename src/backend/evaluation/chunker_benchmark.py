@@ -0,0 +1,175 @@
+"""Compare structured-row chunking against the previous iterrows-based
+implementation: throughput and peak memory (tracemalloc) for producing and
+consuming all row chunks of a DataFrame. Fails if the row texts differ,
+since chunk ids are hashes of the text.
+
+Uses a synthetic course catalog, or the first sheet of a workbook.
+
+To run:
+python -m src.backend.evaluation.chunker_benchmark
+Options can be overridden from the command line, e.g.
+python -m src.backend.evaluation.chunker_benchmark +rows=100000
+python -m src.backend.evaluation.chunker_benchmark +path=./data/data_to_ingest/syn_data.xlsx
+"""
+import gc
+import logging
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+import hydra
+import numpy as np
+import pandas as pd
+from omegaconf import DictConfig
+from src.backend.utils.logging import setup_logging
+from src.backend.dataprocessor.chunker import Chunker, serialize_rows
+
+logger = logging.getLogger(__name__)
+logger.info("Setting up logging configuration.")
+setup_logging()
+
+
+def synthetic_catalog(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'course_name': [f"Course {i}" for i in range(rows)],
+        'subject': rng.choice(['English', 'Science', 'Maths', 'Art'], rows),
+        'min_age': rng.integers(3, 12, rows),
+        'max_age': rng.integers(12, 18, rows),
+        'price': rng.uniform(100, 800, rows).round(2),
+        'teacher': rng.choice(['Ms Tan', 'Mr Lim', 'Dr Lee'], rows),
+        'start_date': pd.Timestamp('2025-01-06')
+        + pd.to_timedelta(rng.integers(0, 365, rows), unit='D'),
+        'description': 'Small-group class with weekly progress reports',
+    })
+
+
+def dtype_frames() -> Dict[str, pd.DataFrame]:
+    """Small frames of dtypes whose iterrows text depends on the others"""
+    float32 = np.array([0.1, np.nan, 2.5], dtype=np.float32)
+    category = pd.Categorical(['English', None, 'Art'])
+    return {
+        'float32': pd.DataFrame({'fee': float32}),
+        'float32_int': pd.DataFrame({
+            'fee': float32, 'seats': np.array([8, 10, 12], dtype=np.int32)
+        }),
+        'category': pd.DataFrame({'subject': category}),
+        'category_float': pd.DataFrame({
+            'level': pd.Categorical([1.5, None, 3.0]), 'fee': [1.0, 2.0, 3.0]
+        }),
+        'mixed': pd.DataFrame({
+            'fee': float32,
+            'subject': category,
+            'teacher': ['Ms Tan', None, 'Dr Lee'],
+            'seats': np.array([8, 10, 12], dtype=np.int8),
+            'weekend': [True, False, True],
+            'start_date': pd.to_datetime(['2025-01-06', None, '2025-03-03']),
+        }),
+        'nullable': pd.DataFrame({
+            'seats': pd.array([8, None, 12], dtype='Int64'),
+            'teacher': ['Ms Tan', 'Mr Lim', None],
+        }),
+    }
+
+
+def iterrows_chunks(doc: pd.DataFrame, metadata: Dict) -> List[Dict]:
+    """The previous Chunker._chunk_structured_doc row loop"""
+    total_rows = len(doc)
+    chunks = []
+    for index, row in doc.iterrows():
+        row_text = " ".join([
+            f"{col}: {str(val)}"
+            for col, val in row.items()
+        ])
+        chunk_metadata = {
+            **metadata,
+            'is_structured': True,
+            'chunk_type': 'row',
+            'chunk_index': index,
+            'total_chunks': total_rows
+        }
+        chunks.append({
+            'content': row_text,
+            'metadata': chunk_metadata
+        })
+    return chunks
+
+
+def check_same_text(doc: pd.DataFrame, metadata: Dict) -> None:
+    legacy = [chunk['content'] for chunk in iterrows_chunks(doc, metadata)]
+    texts = serialize_rows(doc)
+    mismatches = [
+        i for i, (old, new) in enumerate(zip(legacy, texts)) if old != new
+    ]
+    if len(legacy) != len(texts) or mismatches:
+        i = mismatches[0] if mismatches else min(len(legacy), len(texts))
+        raise AssertionError(
+            f"Row text differs from iterrows in {len(mismatches)} rows, "
+            f"e.g. row {i}: {legacy[i:i + 1]} != {texts[i:i + 1]}"
+        )
+
+
+def measure(name: str, chunk_fn: Callable[[], object]) -> Dict:
+    """Chunk and consume every chunk like the embedder does"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    chunks = chunk_fn()
+    num_chunks = 0
+    for chunk in chunks:
+        chunk['metadata'].get('source')
+        num_chunks += len(chunk['content']) > 0
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'name': name,
+        'chunks': num_chunks,
+        'seconds': elapsed,
+        'rows_per_second': num_chunks / elapsed if elapsed else 0.0,
+        'peak_mb': peak / 2**20,
+    }
+
+
+@hydra.main(
+    version_base=None,
+    config_path="../../../config",
+    config_name="data_ingest")
+def main(cfg: DictConfig) -> None:
+    path = cfg.get('path')
+    if path:
+        doc = pd.read_excel(path)
+    else:
+        doc = synthetic_catalog(cfg.get('rows', 100000), cfg.get('seed', 0))
+    metadata = {'source': path or 'synthetic', 'rows_threshold': 0}
+    check_same_text(doc, metadata)
+    # All-numeric rows, which iterrows upcasts to a common dtype
+    check_same_text(doc.select_dtypes('number'), metadata)
+    for frame in dtype_frames().values():
+        check_same_text(frame, metadata)
+    chunker = Chunker(
+        token_threshold=cfg.chunker.token_threshold,
+        chunking_config={
+            'strategy': 'recursive',
+            'chunk_size': cfg.chunker.recursive.chunk_size,
+            'chunk_overlap': cfg.chunker.recursive.chunk_overlap,
+        }
+    )
+    results = [
+        measure('iterrows', lambda: iterrows_chunks(doc, metadata)),
+        measure(
+            'vectorized',
+            lambda: chunker._chunk_structured_doc(doc, metadata)['chunks']
+        ),
+    ]
+    logger.info(f"Chunker benchmark on {len(doc)} rows: {results}")
+    print(f"{'':>12} {'chunks':>8} {'seconds':>8} {'rows/s':>10} "
+          f"{'peak MB':>8}")
+    for result in results:
+        print(f"{result['name']:>12} {result['chunks']:>8} "
+              f"{result['seconds']:>8.2f} {result['rows_per_second']:>10.0f} "
+              f"{result['peak_mb']:>8.1f}")
+    print(f"speedup: {results[0]['seconds'] / results[1]['seconds']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
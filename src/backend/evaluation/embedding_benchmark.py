@@ -0,0 +1,98 @@
+"""Compare embedding throughput of the OpenAI and local sentence-transformers
+providers on the same texts, embedded in add_batch_size batches like the
+ingestion writes them.
+
+Uses row texts of a synthetic course catalog, or of the first sheet of a
+workbook. The local model runs with the local_embedding config.
+
+To run:
+python -m src.backend.evaluation.embedding_benchmark
+Options can be overridden from the command line, e.g.
+python -m src.backend.evaluation.embedding_benchmark +texts=5000
+python -m src.backend.evaluation.embedding_benchmark \
+    +local_model=sentence-transformers/all-MiniLM-L6-v2 \
+    local_embedding.batch_size=128 local_embedding.num_threads=4
+python -m src.backend.evaluation.embedding_benchmark \
+    '+providers=[sentence_transformers]'
+"""
+import logging
+import time
+from typing import Dict, List
+import hydra
+import pandas as pd
+from omegaconf import DictConfig
+from src.backend.utils.logging import setup_logging
+from src.backend.utils.settings import SETTINGS
+from src.backend.utils.local_embedding import create_embedding_function
+from src.backend.dataprocessor.chunker import serialize_rows
+from src.backend.evaluation.chunker_benchmark import synthetic_catalog
+
+logger = logging.getLogger(__name__)
+logger.info("Setting up logging configuration.")
+setup_logging()
+
+DEFAULT_LOCAL_MODEL = (
+    'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
+)
+
+
+def measure(
+    name: str, embedding_function, texts: List[str], batch_size: int
+) -> Dict:
+    # Warm-up, loads the model or opens the connection
+    embedding_function(texts[:1])
+    start = time.perf_counter()
+    dimensions = 0
+    for i in range(0, len(texts), batch_size):
+        embeddings = embedding_function(texts[i:i + batch_size])
+        dimensions = len(embeddings[0])
+    elapsed = time.perf_counter() - start
+    return {
+        'name': name,
+        'texts': len(texts),
+        'dimensions': dimensions,
+        'seconds': elapsed,
+        'texts_per_second': len(texts) / elapsed if elapsed else 0.0,
+    }
+
+
+@hydra.main(
+    version_base=None,
+    config_path="../../../config",
+    config_name="data_ingest")
+def main(cfg: DictConfig) -> None:
+    path = cfg.get('path')
+    num_texts = cfg.get('texts', 2000)
+    if path:
+        doc = pd.read_excel(path).head(num_texts)
+    else:
+        doc = synthetic_catalog(num_texts, cfg.get('seed', 0))
+    texts = serialize_rows(doc)
+    models = {
+        'openai': cfg.llm.embedding_model,
+        'sentence_transformers': cfg.get('local_model', DEFAULT_LOCAL_MODEL),
+    }
+    batch_size = cfg.embedder.get('add_batch_size', 256)
+    results = []
+    for provider in cfg.get('providers', list(models)):
+        embedding_function = create_embedding_function(
+            provider,
+            models[provider],
+            api_key=SETTINGS.OPENAI_API_KEY,
+            local_cfg=cfg.get('local_embedding')
+        )
+        results.append(measure(
+            f"{provider}:{models[provider]}",
+            embedding_function,
+            texts,
+            batch_size
+        ))
+    logger.info(f"Embedding benchmark on {len(texts)} texts: {results}")
+    print(f"{'':>70} {'dims':>6} {'seconds':>8} {'texts/s':>10}")
+    for result in results:
+        print(f"{result['name']:>70} {result['dimensions']:>6} "
+              f"{result['seconds']:>8.2f} {result['texts_per_second']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Precision and recall of human-request detection, per decision path.
+
+Runs the pattern tier of HumanRequestDetector over labelled messages and,
+with use_llm, the LLM check of HumanAgentHandler for ambiguous messages and
+as an LLM-only baseline.
+Reports how many messages are decided without an LLM call.
+
+The dataset is a CSV with a 'message' and a 0/1 'label' column (1: should
+be transferred) and an optional 'history' column. Without one, a small
+built-in sample is used.
+
+To run:
+python -m src.backend.evaluation.human_detection_eval
+Options can be overridden from the command line, e.g.
+python -m src.backend.evaluation.human_detection_eval \
+    +dataset=./data/eval/human_detection.csv +use_llm=true
+"""
+import asyncio
+import logging
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+import hydra
+import pandas as pd
+from omegaconf import DictConfig
+from src.backend.utils.logging import setup_logging
+from src.backend.chat.human_agent_handler import HumanAgentHandler
+from src.backend.chat.human_request_detector import (
+    AMBIGUOUS,
+    HumanRequestDetector
+)
+
+logger = logging.getLogger(__name__)
+logger.info("Setting up logging configuration.")
+setup_logging()
+
+SAMPLE_MESSAGES: List[Tuple[str, int]] = [
+    ("Can I speak to a real person please?", 1),
+    ("I want to talk to a human agent", 1),
+    ("Please connect me with your staff", 1),
+    ("I don't want to chat with a bot anymore", 1),
+    ("This is useless, get me your manager", 1),
+    ("Is there someone I can call about a refund?", 1),
+    ("You don't understand my question, I need help from a person", 1),
+    ("I want to make a complaint to a supervisor", 1),
+    ("What time does the Saturday science workshop start?", 0),
+    ("How much is the English reading class for 6 year olds?", 0),
+    ("Who teaches the advanced maths course?", 0),
+    ("Are your teachers human or online videos?", 0),
+    ("Thanks, that was helpful!", 0),
+    ("My son is a bit frustrated with reading, which class suits him?", 0),
+    ("Do you have a phone number for the Tampines centre?", 0),
+    ("Is the class size small enough for someone shy?", 0),
+    ("Do you have no AI classes?", 0),
+    ("Is there no robot building course?", 0),
+    ("Is the tutor a human being or AI?", 0),
+    ("Is the trial class with a real person or a video?", 0),
+    ("I want to talk to someone about the fees", 0),
+    ("Can I talk to someone about my son's class schedule?", 0),
+    ("I'd like to speak with someone about enrolling", 0),
+]
+
+
+def load_dataset(path: Optional[str]) -> pd.DataFrame:
+    if not path:
+        logger.info("No dataset given, using the built-in sample")
+        return pd.DataFrame(SAMPLE_MESSAGES, columns=['message', 'label'])
+    df = pd.read_csv(path)
+    if 'history' not in df.columns:
+        df['history'] = ''
+    return df
+
+
+def scores(labels: List[int], predictions: List[bool]) -> Dict:
+    tp = sum(1 for y, p in zip(labels, predictions) if y and p)
+    fp = sum(1 for y, p in zip(labels, predictions) if not y and p)
+    fn = sum(1 for y, p in zip(labels, predictions) if y and not p)
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = (
+        2 * precision * recall / (precision + recall)
+        if precision + recall else 0.0
+    )
+    return {'precision': precision, 'recall': recall, 'f1': f1}
+
+
+async def evaluate(cfg: DictConfig) -> None:
+    df = load_dataset(cfg.get('dataset'))
+    use_llm = cfg.get('use_llm', False)
+    messages = df['message'].astype(str).tolist()
+    labels = df['label'].astype(int).tolist()
+    histories = (
+        df['history'].fillna('').astype(str).tolist()
+        if 'history' in df.columns else [''] * len(df)
+    )
+    detector = HumanRequestDetector(
+        dict(cfg.human_agent.get('detection', {}), mode='tiered')
+    )
+    classified = [detector.classify(message) for message in messages]
+    paths = [path for _, path in classified]
+    # Patterns only: ambiguous messages are not transferred
+    heuristic = [bool(decision) for decision, _ in classified]
+
+    summary = {
+        'messages': len(messages),
+        'pattern_transfer': paths.count('pattern_transfer'),
+        'pattern_continue': paths.count('pattern_continue'),
+        AMBIGUOUS: paths.count(AMBIGUOUS),
+        'local_rate': 1 - paths.count(AMBIGUOUS) / len(messages),
+    }
+    results = {'heuristic': scores(labels, heuristic)}
+    decided = [
+        (y, decision) for y, (decision, _) in zip(labels, classified)
+        if decision is not None
+    ]
+    results['patterns_on_decided'] = scores(
+        [y for y, _ in decided], [d for _, d in decided]
+    )
+
+    if use_llm:
+        # The handler only needs the config for detection
+        handler = HumanAgentHandler(SimpleNamespace(cfg=cfg))
+        start = time.perf_counter()
+        llm_only = await asyncio.gather(*[
+            handler._detect_with_llm(message, history)
+            for message, history in zip(messages, histories)
+        ])
+        summary['llm_seconds'] = time.perf_counter() - start
+        results['llm'] = scores(labels, llm_only)
+        # The tiered path reuses the LLM answers for ambiguous messages
+        tiered = [
+            llm_answer if decision is None else decision
+            for (decision, _), llm_answer in zip(classified, llm_only)
+        ]
+        results['tiered'] = scores(labels, tiered)
+
+    logger.info(f"Human detection eval: {summary} {results}")
+    for name, value in summary.items():
+        print(f"{name:>18}: {value:.3f}" if isinstance(value, float)
+              else f"{name:>18}: {value}")
+    for name, result in results.items():
+        print(f"{name:>20}: " + ', '.join(
+            f"{metric} {value:.3f}" for metric, value in result.items()
+        ))
+
+
+@hydra.main(
+    version_base=None,
+    config_path="../../../config",
+    config_name="config")
+def main(cfg: DictConfig) -> None:
+    asyncio.run(evaluate(cfg))
+
+
+if __name__ == "__main__":
+    main()
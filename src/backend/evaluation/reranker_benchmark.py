@@ -0,0 +1,148 @@
+"""Compare the torch and quantized ONNX reranker backends on the ingested
+collection: latency per query and ranking agreement (NDCG@k, top-1).
+
+To run:
+python -m src.backend.evaluation.reranker_benchmark
+Options can be overridden from the command line, e.g.
+python -m src.backend.evaluation.reranker_benchmark +num_queries=100
+"""
+import logging
+import math
+import random
+import statistics
+import time
+from typing import List, Tuple
+import hydra
+import chromadb
+from chromadb.config import Settings
+from omegaconf import DictConfig
+from src.backend.utils.logging import setup_logging
+from src.backend.utils.settings import SETTINGS
+from src.backend.chat.reranker import load_cross_encoder
+from src.backend.utils.local_embedding import embedding_function_from_config
+
+logger = logging.getLogger(__name__)
+logger.info("Setting up logging configuration.")
+setup_logging()
+
+
+def ndcg_at_k(reference_scores: List[float], ranking: List[int], k: int) -> float:
+    """NDCG@k of a ranking, using the reference model's scores as gains"""
+    def dcg(order: List[int]) -> float:
+        return sum(
+            reference_scores[doc] / math.log2(rank + 2)
+            for rank, doc in enumerate(order[:k])
+        )
+    ideal = dcg(sorted(
+        range(len(reference_scores)),
+        key=lambda i: reference_scores[i],
+        reverse=True
+    ))
+    return dcg(ranking) / ideal if ideal > 0 else 1.0
+
+
+def sample_queries(collection, num_queries: int, seed: int) -> List[str]:
+    """Build queries from the keywords of randomly sampled chunks"""
+    stored = collection.get(include=['documents', 'metadatas'])
+    rows = list(zip(stored['documents'], stored['metadatas']))
+    random.Random(seed).shuffle(rows)
+    queries = []
+    for doc, meta in rows[:num_queries]:
+        keywords = (meta or {}).get('keywords', '')
+        words = keywords.strip('[]').replace('"', '').replace(',', ' ').split()
+        queries.append(' '.join(words[:6]) or ' '.join(doc.split()[:8]))
+    return queries
+
+
+def time_predict(model, pairs: List[Tuple[str, str]], repeats: int):
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        scores = model.predict(pairs)
+        latencies.append(time.perf_counter() - start)
+    return [float(s) for s in scores], latencies
+
+
+@hydra.main(
+    version_base=None,
+    config_path="../../../config",
+    config_name="config")
+def main(cfg: DictConfig) -> None:
+    hr_cfg = cfg.hybrid_retriever
+    num_queries = cfg.get('num_queries', 50)
+    repeats = cfg.get('repeats', 3)
+    k = cfg.get('ndcg_k', hr_cfg.reranker_top_k)
+
+    client = chromadb.PersistentClient(
+        path=hr_cfg.persist_dir,
+        settings=Settings(anonymized_telemetry=False)
+    )
+    collection = client.get_collection(
+        name=hr_cfg.collection,
+        embedding_function=embedding_function_from_config(
+            cfg, api_key=SETTINGS.OPENAI_API_KEY
+        )
+    )
+    queries = sample_queries(collection, num_queries, cfg.get('seed', 0))
+    candidates = collection.query(
+        query_texts=queries, n_results=hr_cfg.top_k, include=['documents']
+    )['documents']
+
+    torch_model = load_cross_encoder(hr_cfg.reranker_model, backend="torch")
+    onnx_model = load_cross_encoder(
+        hr_cfg.reranker_model,
+        backend="onnx",
+        onnx_dir=hr_cfg.get('reranker_onnx_dir', './data/models/reranker_onnx'),
+        quantization_config=hr_cfg.get('reranker_quantization', 'avx2'),
+        intra_op_threads=hr_cfg.get('reranker_intra_op_threads')
+    )
+
+    torch_latencies, onnx_latencies, ndcgs, top1_agreement = [], [], [], []
+    for query, docs in zip(queries, candidates):
+        if not docs:
+            continue
+        pairs = [(query, doc) for doc in docs]
+        torch_scores, latencies = time_predict(torch_model, pairs, repeats)
+        torch_latencies.extend(latencies)
+        onnx_scores, latencies = time_predict(onnx_model, pairs, repeats)
+        onnx_latencies.extend(latencies)
+
+        onnx_ranking = sorted(
+            range(len(docs)), key=lambda i: onnx_scores[i], reverse=True
+        )
+        # Sigmoid scores are already in [0, 1] and usable as gains
+        ndcgs.append(ndcg_at_k(torch_scores, onnx_ranking, k))
+        top1_agreement.append(
+            onnx_ranking[0]
+            == max(range(len(docs)), key=lambda i: torch_scores[i])
+        )
+
+    if not ndcgs:
+        logger.warning("No candidates retrieved, is the collection empty?")
+        return
+
+    def p95(values: List[float]) -> float:
+        return sorted(values)[int(0.95 * (len(values) - 1))]
+
+    summary = {
+        'queries': len(ndcgs),
+        'pairs_per_query': hr_cfg.top_k,
+        'torch_median_ms': statistics.median(torch_latencies) * 1000,
+        'torch_p95_ms': p95(torch_latencies) * 1000,
+        'onnx_median_ms': statistics.median(onnx_latencies) * 1000,
+        'onnx_p95_ms': p95(onnx_latencies) * 1000,
+        'speedup': (
+            statistics.median(torch_latencies)
+            / statistics.median(onnx_latencies)
+        ),
+        f'ndcg@{k}': statistics.mean(ndcgs),
+        'top1_agreement': sum(top1_agreement) / len(top1_agreement),
+    }
+    logger.info(f"Reranker benchmark: {summary}")
+    for name, value in summary.items():
+        print(f"{name:>18}: {value:.3f}" if isinstance(value, float)
+              else f"{name:>18}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -167,9 +167,9 @@ class ChatBotSimulator:
             all_search_results = []
             retrieval_context = ''
             if need_search:
-                for eq in reasoning_result.data.expanded_query:
-                    search_results = await self.hybrid_retriever.search(eq)
-                    all_search_results.append(search_results)
+                all_search_results = await self.hybrid_retriever.search_many(
+                    reasoning_result.data.expanded_query
+                )
                 if all_search_results and len(all_search_results) > 0 and (len(all_search_results[0]) > 0):
                     retrieval_context = all_search_results[0][0]
             result = await self.response_agent.run(
@@ -2,6 +2,7 @@
 python -m src.backend.main.data_ingest_main
 """
 import logging
+import os
 import hydra
 import asyncio
 from omegaconf import DictConfig
@@ -10,6 +11,9 @@ from src.backend.utils.logging import setup_logging
 from src.backend.dataloaders.local_doc_loader import load_local_doc
 from src.backend.dataprocessor.chunker import batch_chunk_doc
 from src.backend.dataprocessor.embedder import embed_doc
+from src.backend.dataprocessor.ingest_manifest import IngestManifest
+from src.backend.dataprocessor.ingest_pipeline import ingest_streaming
+from src.backend.utils.client_registry import configure_http_pool
 
 
 logger = logging.getLogger(__name__)
@@ -24,15 +28,47 @@ setup_logging()
 def main(cfg: DictConfig) -> None:
     """Main entry point to load, chunk, embed documents."""
     logger.info("Starting the data ingestion process.")
+    configure_http_pool(cfg.get('http_pool'))
     if hasattr(cfg, 'local_doc') and cfg.local_doc:
         try:
-            local_docs = load_local_doc(cfg)
-            if local_docs:
-                chunked_doc = batch_chunk_doc(cfg, local_docs)
-                asyncio.run(embed_doc(cfg, chunked_doc))
-                logger.info("Documents loaded and processed successfully.")
+            manifest = IngestManifest(cfg.embedder.get(
+                'manifest_path',
+                os.path.join(cfg.embedder.persist_dir, 'ingest_manifest.json')
+            ))
+            configured = {path_cfg.path for path_cfg in cfg.local_doc.paths}
+            removed_sources = [
+                source for source in manifest.files
+                if source not in configured or not os.path.exists(source)
+            ]
+            # Missing files are left to load_local_doc to report
+            changed_paths = [
+                path_cfg for path_cfg in cfg.local_doc.paths
+                if not os.path.exists(path_cfg.path)
+                or manifest.needs_ingest(path_cfg.path)
+            ]
+            logger.info(f"{len(changed_paths)} new or changed, "
+                        f"{len(cfg.local_doc.paths) - len(changed_paths)} "
+                        f"unchanged, {len(removed_sources)} removed documents")
+            if not (changed_paths or removed_sources):
+                logger.info("No new or changed local documents to ingest")
+                return
+            if cfg.get('ingest_pipeline', {}).get('streaming', False):
+                # Stages overlap, documents are never all in memory at once
+                asyncio.run(ingest_streaming(
+                    cfg, changed_paths, manifest, removed_sources
+                ))
             else:
-                logger.info("No local documents were loaded")
+                local_docs = (
+                    load_local_doc(cfg, changed_paths) if changed_paths else []
+                )
+                chunked_doc = (
+                    batch_chunk_doc(cfg, local_docs) if local_docs else []
+                )
+                asyncio.run(embed_doc(
+                    cfg, chunked_doc, manifest, removed_sources
+                ))
+            manifest.save()
+            logger.info("Documents loaded and processed successfully.")
         except Exception as e:
             logger.error(f"Error loading local documents: {str(e)}")
 
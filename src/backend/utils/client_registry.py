@@ -0,0 +1,161 @@
+"""Process-wide provider clients sharing pooled HTTP connections.
+
+Every OpenAI and Azure OpenAI client is created once per process and
+reuses one httpx connection pool, so calls go over warm keep-alive
+connections instead of paying a TLS handshake, and the number of open
+connections stays bounded under concurrency. HTTP/2 is used when the h2
+package is installed.
+"""
+import importlib.util
+import logging
+import threading
+from typing import Any, Dict, Optional
+import httpx
+from openai import AsyncAzureOpenAI, AsyncOpenAI, OpenAI
+from chromadb.utils import embedding_functions
+from src.backend.utils.settings import SETTINGS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_CONFIG = {
+    'max_connections': 100,
+    'max_keepalive_connections': 20,
+    'keepalive_expiry_seconds': 30,
+    'connect_timeout_seconds': 10,
+    'timeout_seconds': 600,
+    'http2': True,
+}
+
+_pool_config: Dict[str, Any] = dict(DEFAULT_POOL_CONFIG)
+_clients: Dict[tuple, Any] = {}
+_lock = threading.Lock()
+
+
+def configure_http_pool(pool_cfg: Optional[Dict] = None) -> None:
+    """Set pool limits, must run before the first client is created"""
+    if not pool_cfg:
+        return
+    with _lock:
+        if _clients:
+            logger.warning("HTTP pool configured after clients were created, "
+                           "existing clients keep their pools")
+        _pool_config.update(dict(pool_cfg))
+
+
+def _http2_enabled() -> bool:
+    return (
+        bool(_pool_config['http2'])
+        and importlib.util.find_spec('h2') is not None
+    )
+
+
+def _http_client_kwargs() -> Dict[str, Any]:
+    return {
+        'limits': httpx.Limits(
+            max_connections=_pool_config['max_connections'],
+            max_keepalive_connections=_pool_config[
+                'max_keepalive_connections'
+            ],
+            keepalive_expiry=_pool_config['keepalive_expiry_seconds'],
+        ),
+        'timeout': httpx.Timeout(
+            _pool_config['timeout_seconds'],
+            connect=_pool_config['connect_timeout_seconds'],
+        ),
+        'http2': _http2_enabled(),
+    }
+
+
+def _get_or_create(key: tuple, factory):
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = factory()
+            _clients[key] = client
+            logger.info(f"Created shared client {key[0]}")
+        return client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    return _get_or_create(
+        ('async_http',),
+        lambda: httpx.AsyncClient(**_http_client_kwargs())
+    )
+
+
+def get_http_client() -> httpx.Client:
+    return _get_or_create(
+        ('http',),
+        lambda: httpx.Client(**_http_client_kwargs())
+    )
+
+
+def get_async_openai_client() -> AsyncOpenAI:
+    return _get_or_create(
+        ('async_openai',),
+        lambda: AsyncOpenAI(
+            api_key=SETTINGS.OPENAI_API_KEY,
+            http_client=get_async_http_client()
+        )
+    )
+
+
+def get_async_azure_openai_client(
+    api_version: str = '2024-09-01-preview'
+) -> AsyncAzureOpenAI:
+    return _get_or_create(
+        ('async_azure_openai', api_version),
+        lambda: AsyncAzureOpenAI(
+            azure_endpoint=SETTINGS.AZURE_ENDPOINT,
+            api_version=api_version,
+            api_key=SETTINGS.AZURE_API_KEY,
+            http_client=get_async_http_client()
+        )
+    )
+
+
+def get_openai_client(api_key: Optional[str] = None) -> OpenAI:
+    """Sync client, used by Chroma embedding functions"""
+    api_key = api_key or SETTINGS.OPENAI_API_KEY
+    return _get_or_create(
+        ('openai', api_key),
+        lambda: OpenAI(
+            api_key=api_key,
+            http_client=get_http_client()
+        )
+    )
+
+
+def openai_embedding_function(
+    model_name: str,
+    api_key: Optional[str] = None
+) -> embedding_functions.OpenAIEmbeddingFunction:
+    """Chroma OpenAI embedding function using the shared sync client
+
+    The function keeps its Chroma name and config, so collections created
+    with it load the same way as before.
+    """
+    embedding_function = embedding_functions.OpenAIEmbeddingFunction(
+        api_key=api_key or SETTINGS.OPENAI_API_KEY,
+        model_name=model_name
+    )
+    embedding_function.client = get_openai_client(embedding_function.api_key)
+    return embedding_function
+
+
+async def close_clients() -> None:
+    """Close the shared connection pools"""
+    with _lock:
+        clients = dict(_clients)
+        _clients.clear()
+    for key, client in clients.items():
+        try:
+            if key[0] == 'async_http':
+                await client.aclose()
+            elif key[0] == 'http':
+                client.close()
+        except Exception as e:
+            logger.error(f"Error closing shared client {key[0]}: {e}")
@@ -0,0 +1,211 @@
+"""Cache for query embeddings, in front of the embedding provider.
+
+Entries are keyed by (model, normalized text). A bounded in-memory LRU tier
+serves repeated queries without a network round-trip, and an optional SQLite
+tier keeps embeddings across restarts. SQLite writes are committed in
+batches, and rows past the TTL are deleted at startup and periodically.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    def __init__(
+        self,
+        max_size: int = 10000,
+        ttl_seconds: Optional[float] = None,
+        persist_path: Optional[str] = None,
+        commit_batch_size: int = 64,
+        commit_interval_seconds: float = 5,
+        purge_interval_seconds: float = 3600
+    ):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, np.ndarray]]" = (
+            OrderedDict()
+        )
+        # Embedding calls may run in worker threads
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.commit_batch_size = commit_batch_size
+        self.commit_interval = commit_interval_seconds
+        self.purge_interval = purge_interval_seconds
+        self._uncommitted = 0
+        self._last_commit = time.monotonic()
+        self._last_purge = time.monotonic()
+        self._db = None
+        if persist_path:
+            os.makedirs(os.path.dirname(persist_path) or '.', exist_ok=True)
+            self._db = sqlite3.connect(persist_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT, text TEXT, created REAL, vector BLOB, "
+                "PRIMARY KEY (model, text))"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_created "
+                "ON embeddings (created)"
+            )
+            self._purge_expired()
+            self._db.commit()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Case- and whitespace-insensitive cache key for a text"""
+        return ' '.join(text.casefold().split())
+
+    def _expired(self, created: float) -> bool:
+        return (
+            self.ttl_seconds is not None
+            and time.time() - created > self.ttl_seconds
+        )
+
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        key = (model, self.normalize(text))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._expired(entry[0]):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT created, vector FROM embeddings "
+                    "WHERE model = ? AND text = ?",
+                    key
+                ).fetchone()
+                if row is not None and not self._expired(row[0]):
+                    vector = np.frombuffer(row[1], dtype=np.float32)
+                    self._set(key, row[0], vector)
+                    self.disk_hits += 1
+                    return vector
+            self.misses += 1
+            return None
+
+    def put(self, model: str, text: str, vector) -> None:
+        self.put_many(model, [(text, vector)])
+
+    def put_many(self, model: str, items: List[Tuple[str, object]]) -> None:
+        """Cache (text, vector) pairs, written to SQLite in one statement"""
+        created = time.time()
+        rows = []
+        with self._lock:
+            for text, vector in items:
+                key = (model, self.normalize(text))
+                vector = np.asarray(vector, dtype=np.float32)
+                self._set(key, created, vector)
+                rows.append((*key, created, vector.tobytes()))
+            if self._db is not None and rows:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)",
+                    rows
+                )
+                self._uncommitted += len(rows)
+                self._maybe_commit()
+
+    def _maybe_commit(self) -> None:
+        """Commit once enough writes are pending or some time has passed,
+        and delete expired rows when due. Called with the lock held."""
+        now = time.monotonic()
+        if now - self._last_purge >= self.purge_interval:
+            self._purge_expired()
+        if (
+            self._uncommitted >= self.commit_batch_size
+            or now - self._last_commit >= self.commit_interval
+        ):
+            self._commit()
+
+    def _commit(self) -> None:
+        self._db.commit()
+        self._uncommitted = 0
+        self._last_commit = time.monotonic()
+
+    def _purge_expired(self) -> None:
+        self._last_purge = time.monotonic()
+        if self.ttl_seconds is None:
+            return
+        deleted = self._db.execute(
+            "DELETE FROM embeddings WHERE created < ?",
+            (time.time() - self.ttl_seconds,)
+        ).rowcount
+        self._uncommitted += deleted
+        if deleted:
+            logger.info(f"Deleted {deleted} expired cached embeddings")
+
+    def _set(self, key: Tuple[str, str], created: float, vector) -> None:
+        self._entries[key] = (created, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (
+                (self.hits + self.disk_hits) / lookups if lookups else 0.0
+            ),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._commit()
+                self._db.close()
+                self._db = None
+
+
+class CachedEmbeddingFunction:
+    """Embedding function that only sends cache misses to the provider.
+
+    Misses of one call are embedded together in a single provider request.
+    """
+
+    def __init__(
+        self,
+        embedding_function: Callable[[List[str]], List],
+        model_name: str,
+        cache: EmbeddingCache
+    ):
+        self.embedding_function = embedding_function
+        self.model_name = model_name
+        self.cache = cache
+
+    def __call__(self, input: List[str]) -> List[np.ndarray]:
+        embeddings = [self.cache.get(self.model_name, text) for text in input]
+        # Texts that normalize to the same key are embedded only once
+        missing = {}
+        for text, embedding in zip(input, embeddings):
+            if embedding is None:
+                missing.setdefault(self.cache.normalize(text), text)
+        if missing:
+            vectors = self.embedding_function(list(missing.values()))
+            self.cache.put_many(
+                self.model_name, list(zip(missing.values(), vectors))
+            )
+            computed = {
+                key: np.asarray(vector, dtype=np.float32)
+                for key, vector in zip(missing, vectors)
+            }
+            embeddings = [
+                computed[self.cache.normalize(text)]
+                if embedding is None else embedding
+                for text, embedding in zip(input, embeddings)
+            ]
+        return embeddings
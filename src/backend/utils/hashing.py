@@ -0,0 +1,20 @@
+"""Content hashes used for deterministic ids and file fingerprints"""
+import hashlib
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's bytes, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def content_id(*parts: str) -> str:
+    """Deterministic id from content, e.g. content_id(source, chunk_text)"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()[:32]
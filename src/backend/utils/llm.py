@@ -1,12 +1,17 @@
 """Plain Vanilla OpenAI API Wrapper for LLM"""
 from src.backend.utils.settings import SETTINGS
-from openai import AsyncOpenAI
+from src.backend.utils.client_registry import get_async_openai_client
+from src.backend.utils.single_flight import SingleFlight
 
 
 class LLM():
+    # Identical concurrent requests, from any instance, share one call
+    inflight = SingleFlight('llm.generate')
+
     def __init__(self):
         self.openai_api_key = SETTINGS.OPENAI_API_KEY
-        self.client = AsyncOpenAI(api_key=self.openai_api_key)
+        # Shared across instances, reuses pooled connections
+        self.client = get_async_openai_client()
 
     async def generate(
         self,
@@ -14,6 +19,20 @@ class LLM():
         user_prompt: str,
         model: str = 'gpt-4o-mini',
         temperature: float = 0.2
+    ) -> str:
+        return await self.inflight.do(
+            (system_prompt, user_prompt, model, temperature),
+            lambda: self._generate(
+                system_prompt, user_prompt, model, temperature
+            )
+        )
+
+    async def _generate(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        model: str,
+        temperature: float
     ) -> str:
         response = await self.client.chat.completions.create(
            messages=[
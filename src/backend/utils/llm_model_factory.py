@@ -2,8 +2,10 @@ from pydantic_ai.models.openai import OpenAIModel
 from pydantic_ai.models.anthropic import AnthropicModel
 from pydantic_ai.models.gemini import GeminiModel
 from pydantic_ai.providers.openai import OpenAIProvider
-from openai import AsyncOpenAI, AsyncAzureOpenAI
-from src.backend.utils.settings import SETTINGS
+from src.backend.utils.client_registry import (
+    get_async_azure_openai_client,
+    get_async_openai_client
+)
 
 
 class LLMModelFactory:
@@ -19,33 +21,22 @@ class LLMModelFactory:
             
         Returns:
             A configured model instance for PydanticAI
+
+        OpenAI and Azure models share one client per process, so all agents
+        reuse the same connection pool.
         """
         provider_type = config.get('provider', 'openai')
         model_name = config['model_name']
 
-        if provider_type == 'openai':
-            return OpenAIModel(model_name)
-        elif provider_type == 'openai_async':
-            client = AsyncOpenAI()
-            return OpenAIModel(
-                model_name,
-                provider=OpenAIProvider(openai_client=client)
-            )
-        elif provider_type == 'azure':
-            client = AsyncAzureOpenAI(
-                azure_endpoint=SETTINGS.AZURE_ENDPOINT,
-                api_version=config.get('api_version', '2024-09-01-preview'),
-                api_key=SETTINGS.AZURE_API_KEY,
-            )
+        if provider_type in ('openai', 'openai_async'):
+            client = get_async_openai_client()
             return OpenAIModel(
                 model_name,
                 provider=OpenAIProvider(openai_client=client)
             )
-        elif provider_type == 'azure_async':
-            client = AsyncAzureOpenAI(
-                azure_endpoint=SETTINGS.AZURE_ENDPOINT,
-                api_version=config.get('api_version', '2024-09-01-preview'),
-                api_key=SETTINGS.AZURE_API_KEY,
+        elif provider_type in ('azure', 'azure_async'):
+            client = get_async_azure_openai_client(
+                config.get('api_version', '2024-09-01-preview')
             )
             return OpenAIModel(
                 model_name,
@@ -0,0 +1,111 @@
+"""Embedding functions shared by ingestion and retrieval.
+
+Documents and queries have to be embedded by the same provider and model,
+so the Embedder and the HybridRetriever both create theirs here from the
+llm.embedding_provider config. The sentence_transformers provider runs the
+model locally, e.g. on CPU for offline or high-volume ingestion, without
+network latency or per-token cost.
+"""
+import logging
+import threading
+from typing import Dict, Optional
+import numpy as np
+from chromadb.api.types import Documents, Embeddings
+from chromadb.utils import embedding_functions
+from src.backend.utils.client_registry import openai_embedding_function
+
+logger = logging.getLogger(__name__)
+
+_threads_lock = threading.Lock()
+
+
+class BatchedSentenceTransformerEmbeddingFunction(
+    embedding_functions.SentenceTransformerEmbeddingFunction
+):
+    """Chroma's SentenceTransformer embedding function, encoding in batches
+    of a configurable size
+
+    Keeps the Chroma name and config, so collections created with it load
+    with the stock function as well. Models are shared per process.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        device: str = 'cpu',
+        normalize_embeddings: bool = True,
+        batch_size: int = 64
+    ):
+        super().__init__(
+            model_name=model_name,
+            device=device,
+            normalize_embeddings=normalize_embeddings
+        )
+        self.batch_size = batch_size
+
+    def __call__(self, input: Documents) -> Embeddings:
+        embeddings = self._model.encode(
+            list(input),
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=self.normalize_embeddings,
+        )
+        return [np.asarray(embedding, dtype=np.float32)
+                for embedding in embeddings]
+
+
+def _set_torch_threads(num_threads: Optional[int]) -> None:
+    """Threads of CPU inference, process-wide (the reranker shares them)"""
+    if not num_threads:
+        return
+    import torch
+    with _threads_lock:
+        if torch.get_num_threads() != num_threads:
+            torch.set_num_threads(num_threads)
+            logger.info(f"Set torch CPU threads to {num_threads}")
+
+
+def create_embedding_function(
+    provider: str,
+    model_name: str,
+    api_key: Optional[str] = None,
+    local_cfg: Optional[Dict] = None
+) -> embedding_functions.EmbeddingFunction:
+    """Embedding function of the configured provider
+
+    Args:
+        provider: 'openai' or 'sentence_transformers'
+        model_name: OpenAI embedding model, or Hugging Face name of a
+            sentence-transformers model
+        api_key: OpenAI API key, defaults to the settings
+        local_cfg: local_embedding config with 'device', 'batch_size',
+            'num_threads' and 'normalize_embeddings'
+    """
+    provider = provider.lower()
+    if provider == 'openai':
+        return openai_embedding_function(model_name, api_key=api_key)
+    if provider == 'sentence_transformers':
+        local_cfg = local_cfg or {}
+        _set_torch_threads(local_cfg.get('num_threads'))
+        logger.info(f"Using local embedding model {model_name}")
+        return BatchedSentenceTransformerEmbeddingFunction(
+            model_name=model_name,
+            device=local_cfg.get('device', 'cpu'),
+            normalize_embeddings=local_cfg.get('normalize_embeddings', True),
+            batch_size=local_cfg.get('batch_size', 64)
+        )
+    raise ValueError(f"Unsupported embedding provider: {provider}")
+
+
+def embedding_function_from_config(
+    cfg, api_key: Optional[str] = None
+) -> embedding_functions.EmbeddingFunction:
+    """Embedding function for cfg.llm.embedding_provider (default openai)
+    and cfg.llm.embedding_model"""
+    return create_embedding_function(
+        cfg.llm.get('embedding_provider', 'openai'),
+        cfg.llm.embedding_model,
+        api_key=api_key,
+        local_cfg=cfg.get('local_embedding')
+    )
+
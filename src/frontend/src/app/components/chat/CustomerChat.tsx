@@ -119,7 +119,26 @@ export default function CustomerChat({ customerId, sessionId }: CustomerChatProp
       const data = JSON.parse(event.data);
       console.log('WebSocket message received:', data);
       
-      if (data.type === 'new_message') {
+      if (data.type === 'bot_delta') {
+        // Streamed piece of a bot response, appended to its message
+        setMessages(prev => {
+          const index = prev.findIndex(msg => msg.id === data.message_id);
+          if (index === -1) {
+            return [...prev, {
+              id: data.message_id,
+              content: data.delta,
+              sender: 'bot',
+              timestamp: new Date(data.timestamp)
+            }];
+          }
+          const updatedMessages = [...prev];
+          updatedMessages[index] = {
+            ...prev[index],
+            content: prev[index].content + data.delta
+          };
+          return updatedMessages;
+        });
+      } else if (data.type === 'new_message') {
         // For user messages, only display if they weren't sent by this client
         if (data.message.role === 'user' && data.message.customer_id === customerId) {
           console.log('Ignoring own message echo from server');
@@ -128,7 +147,7 @@ export default function CustomerChat({ customerId, sessionId }: CustomerChatProp
         
         // For all other messages (bot/staff/system or messages from other users)
         const newMessage: UIMessage = {
-          id: `${data.message.timestamp}-${Math.random()}`,
+          id: data.message_id || `${data.message.timestamp}-${Math.random()}`,
           content: data.message.content,
           sender: mapRoleToSender(data.message.role),
           timestamp: new Date(data.message.timestamp)
@@ -136,6 +155,10 @@ export default function CustomerChat({ customerId, sessionId }: CustomerChatProp
         
         // Enhanced duplicate detection
         setMessages(prev => {
+          // Complete version of a streamed response replaces the deltas
+          if (prev.some(msg => msg.id === newMessage.id)) {
+            return prev.map(msg => msg.id === newMessage.id ? newMessage : msg);
+          }
           // Check for duplicates more carefully - consider content similarity
           const isDuplicate = prev.some(msg => {
             // If content is identical and timestamps are close, likely duplicate
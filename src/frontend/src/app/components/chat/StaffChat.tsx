@@ -138,7 +138,29 @@ export default function StaffChat({ selectedSession, activeSessions }: StaffChat
       try {
         const data = JSON.parse(event.data);
         
-        if (data.type === 'new_message') {
+        if (data.type === 'bot_delta') {
+          if (data.customer_id !== selectedSession.customer_id) {
+            return;
+          }
+          // Streamed piece of a bot response, appended to its message
+          setMessages(prev => {
+            const index = prev.findIndex(msg => msg.id === data.message_id);
+            if (index === -1) {
+              return [...prev, {
+                id: data.message_id,
+                content: data.delta,
+                sender: 'bot',
+                timestamp: new Date(data.timestamp)
+              }];
+            }
+            const updatedMessages = [...prev];
+            updatedMessages[index] = {
+              ...prev[index],
+              content: prev[index].content + data.delta
+            };
+            return updatedMessages;
+          });
+        } else if (data.type === 'new_message') {
           if (data.message.customer_id !== selectedSession.customer_id) {
             console.warn('Message filtered out - customer mismatch');
             return;
@@ -154,13 +176,17 @@ export default function StaffChat({ selectedSession, activeSessions }: StaffChat
           }
 
           const newMessage: UIMessage = {
-            id: `${data.message.timestamp}-${data.message.role}-${data.message.content.substring(0, 20)}`,
+            id: data.message_id || `${data.message.timestamp}-${data.message.role}-${data.message.content.substring(0, 20)}`,
             content: data.message.content,
             sender: mapRoleToSender(data.message.role),
             timestamp: new Date(data.message.timestamp)
           };
           
           setMessages(prev => {
+            // Complete version of a streamed response replaces the deltas
+            if (prev.some(msg => msg.id === newMessage.id)) {
+              return prev.map(msg => msg.id === newMessage.id ? newMessage : msg);
+            }
             // Check for duplicates
             const isDuplicate = prev.some(msg => {
               const contentMatch = msg.content === newMessage.content;